@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, BigInteger
+from sqlalchemy import ForeignKey, BigInteger, Index
 from sqlalchemy.orm import Mapped, mapped_column, Relationship
 from shortuuid import uuid
 
@@ -14,6 +14,11 @@ class BlockedUser(Base):
         ForeignKey("users.id", ondelete="CASCADE")
     )
 
+    __table_args__ = (
+        Index("ix_BlockedUser_pair", "user_id", "blocked_user_id"),
+        Index("ix_BlockedUser_blocked_user_id", "blocked_user_id"),
+    )
+
 
 class RequestedUser(Base):
     __tablename__ = "RequestedUser"
@@ -24,6 +29,11 @@ class RequestedUser(Base):
         ForeignKey("users.id", ondelete="CASCADE")
     )
 
+    __table_args__ = (
+        Index("ix_RequestedUser_pair", "user_id", "requested_user_id"),
+        Index("ix_RequestedUser_requested_user_id", "requested_user_id"),
+    )
+
 
 class Friend(Base):
     __tablename__ = "Friend"
@@ -34,6 +44,11 @@ class Friend(Base):
         ForeignKey("users.id", ondelete="CASCADE")
     )
 
+    __table_args__ = (
+        Index("ix_Friend_pair", "user_id", "friend_user_id"),
+        Index("ix_Friend_friend_user_id", "friend_user_id"),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
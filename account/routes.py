@@ -2,26 +2,30 @@ from uuid import uuid4
 
 from PIL import Image
 from fastapi import APIRouter, Request, HTTPException, UploadFile, File
-from sqlalchemy import select
+from sqlalchemy import select, delete, cast, REAL
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload
 from starlette import status
 
 import settings
 from auth.exceptions import UserNotFoundException, IncorrectCredentialsException
 from auth.permission import require_authentication
-from auth.utils import Token, bcrypt_context
+from auth.hashing import password_hasher
+from auth.utils import Token
 from database.asyncdb import asyncdb_dependency
 from database.mangodb import mangodb_dependency
 from message.mangomodel import ChatRoom
 from notification.models import Notification, NotificationType, json_data_friend_request
 from notification.utils import send_notification_to_user
 from query import UserQuery, NotificationQuery
-from websocket.manager.connections import room_connections
-from .models import User
+from websocket.manager.fanout import publish_close_room, publish_room_changed
+from .models import User, Friend, RequestedUser, BlockedUser
 from .schemas import (
     CreateUserRequest,
     UpdateUserRequest,
     FriendSearch,
+    FriendSearchPage,
+    ContactMatchRequest,
     UpdateUsername,
     UpdatePassword,
 )
@@ -29,9 +33,13 @@ from .utils import (
     create_user,
     update_user_data,
     get_user_for_add,
+    with_relations,
     create_room,
     change_room_status,
     get_friend_search_res,
+    name_search_filter,
+    fuzzy_name_match,
+    match_contact_book,
     extract_integrity_error,
 )
 
@@ -58,7 +66,7 @@ async def create_new_user(
 async def update_user(
     request: Request, db: asyncdb_dependency, update_data: UpdateUserRequest
 ):
-    user = await UserQuery.one(db, request.user.id)
+    user = await UserQuery.one(db, request.user.id, {})
     if user is None:
         raise UserNotFoundException()
     return await update_user_data(db, user, update_data)
@@ -88,7 +96,7 @@ async def upload_file(
                 new_height = int(new_width / aspect_ratio)
                 img.resize((new_width, new_height)).save(path)
 
-    user = await UserQuery.one(db, request.user.id)
+    user = await UserQuery.one(db, request.user.id, {})
     user.profile = settings.HOSTNAME + "/" + path
     await db.commit()
 
@@ -104,10 +112,10 @@ async def upload_file(
 async def update_username(
     request: Request, db: asyncdb_dependency, update_data: UpdateUsername
 ):
-    user = await UserQuery.one(db, request.user.id)
+    user = await UserQuery.one(db, request.user.id, {})
     if user is None:
         raise UserNotFoundException()
-    if not bcrypt_context.verify(update_data.password, user.hashed_password):
+    if not await password_hasher.verify(update_data.password, user.hashed_password):
         raise IncorrectCredentialsException()
 
     user.username = update_data.username
@@ -128,12 +136,12 @@ async def update_username(
 async def update_password(
     request: Request, db: asyncdb_dependency, update_data: UpdatePassword
 ):
-    user = await UserQuery.one(db, request.user.id)
+    user = await UserQuery.one(db, request.user.id, {})
     if user is None:
         raise UserNotFoundException()
-    if not bcrypt_context.verify(update_data.old, user.hashed_password):
+    if not await password_hasher.verify(update_data.old, user.hashed_password):
         raise IncorrectCredentialsException()
-    user.hashed_password = bcrypt_context.hash(update_data.new)
+    user.hashed_password = await password_hasher.hash(update_data.new)
     await db.commit()
 
     return user
@@ -151,16 +159,20 @@ async def delete_user(
     if user is None:
         raise UserNotFoundException()
 
-    # close the room if connected and deactivate the room
-    room_query = {"users": {"$elemMatch": {"user_id": user.id}}}
-    rooms = await mangodb.find(ChatRoom, room_query)
-    for room in rooms:
-        if room.is_active:
-            room.is_active = False
-            await mangodb.commit()
-        if str(room.id) in room_connections:
-            # close the room
-            del room_connections[str(room.id)]
+    # deactivate the rooms of the user, then close them on every worker
+    collection = mangodb.engine.get_collection(ChatRoom)
+    room_ids = [
+        room["_id"]
+        async for room in collection.find({"users.user_id": user.id}, {"_id": 1})
+    ]
+    if room_ids:
+        await collection.update_many(
+            {"_id": {"$in": room_ids}, "is_active": True},
+            {"$set": {"is_active": False}},
+        )
+    for room_id in room_ids:
+        await publish_room_changed(str(room_id))
+        await publish_close_room(str(room_id))
 
     await db.delete(user)
     await db.commit()
@@ -172,7 +184,7 @@ async def delete_user(
 async def add_friend(
     request: Request, db: asyncdb_dependency, mangodb: mangodb_dependency, user_id: int
 ):
-    main_user, second_user, is_already_friend = await get_user_for_add(
+    main_user, second_user, relation, is_already_friend = await get_user_for_add(
         db=db, main_user_id=request.user.id, second_user_id=user_id, operation="friend"
     )
 
@@ -181,17 +193,22 @@ async def add_friend(
             detail="user is already in your friend list", status_code=403
         )
 
-    if second_user in main_user.blocked_user:
+    if relation.blocked_user:
         raise HTTPException(
             detail="unblock this user to add to friend list",
             status_code=403,
         )
 
-    if second_user not in main_user.requested_by:
+    if not relation.requested_by:
         raise HTTPException(detail="request this user to add friend", status_code=403)
 
-    main_user.requested_by.remove(second_user)
-    main_user.friend.append(second_user)
+    await db.execute(
+        delete(RequestedUser).where(
+            RequestedUser.user_id == second_user.id,
+            RequestedUser.requested_user_id == main_user.id,
+        )
+    )
+    db.add(Friend(user_id=main_user.id, friend_user_id=second_user.id))
 
     request_notification = await NotificationQuery(
         db,
@@ -228,7 +245,7 @@ async def add_friend(
         room_type="friend",
     )
 
-    return main_user
+    return await with_relations(db, main_user)
 
 
 @router.get("/request/{user_id}")
@@ -236,7 +253,7 @@ async def add_friend(
 async def request_user_for_friend(
     request: Request, db: asyncdb_dependency, user_id: int
 ):
-    main_user, second_user, is_already_requested = await get_user_for_add(
+    main_user, second_user, relation, is_already_requested = await get_user_for_add(
         db=db,
         main_user_id=request.user.id,
         second_user_id=user_id,
@@ -244,21 +261,21 @@ async def request_user_for_friend(
     )
 
     if is_already_requested:
-        return main_user
+        return await with_relations(db, main_user)
 
-    if second_user in main_user.blocked_user:
+    if relation.blocked_user:
         raise HTTPException(
             detail="unblock this user to request this user",
             status_code=403,
         )
 
-    if second_user in main_user.friend:
+    if relation.friend:
         raise HTTPException(
             detail="user is already in your friend list",
             status_code=403,
         )
 
-    main_user.requested_user.append(second_user)
+    db.add(RequestedUser(user_id=main_user.id, requested_user_id=second_user.id))
 
     request_notification = Notification(
         sender_id=main_user.id,
@@ -274,21 +291,29 @@ async def request_user_for_friend(
 
     await send_notification_to_user(request_notification, main_user)
 
-    return main_user
+    return await with_relations(db, main_user)
 
 
 @router.get("/cancel/{user_id}")
 @require_authentication()
 async def cancel_request(request: Request, db: asyncdb_dependency, user_id: int):
-    main_user = await UserQuery.one(db, request.user.id)
-    second_user = await UserQuery.one(db, user_id, False)
+    main_user = await UserQuery.one(db, request.user.id, {})
+    second_user = await UserQuery.one(db, user_id, {})
+    if second_user is None:
+        raise UserNotFoundException()
 
-    if second_user not in main_user.requested_user:
+    relation = await UserQuery.relation_status(db, main_user.id, second_user.id)
+    if not relation.requested_user:
         raise HTTPException(
             detail="user is not in your requested list", status_code=403
         )
 
-    main_user.requested_user.remove(second_user)
+    await db.execute(
+        delete(RequestedUser).where(
+            RequestedUser.user_id == main_user.id,
+            RequestedUser.requested_user_id == second_user.id,
+        )
+    )
 
     request_notification = await NotificationQuery(
         db,
@@ -322,7 +347,7 @@ async def cancel_request(request: Request, db: asyncdb_dependency, user_id: int)
 
     await send_notification_to_user(cancel_notification, main_user)
 
-    return main_user
+    return await with_relations(db, main_user)
 
 
 @router.get("/unfriend/{user_id}")
@@ -330,19 +355,27 @@ async def cancel_request(request: Request, db: asyncdb_dependency, user_id: int)
 async def unfriend_user(
     request: Request, db: asyncdb_dependency, mangodb: mangodb_dependency, user_id: int
 ):
-    main_user, second_user, is_not_friend = await get_user_for_add(
+    main_user, second_user, relation, is_not_friend = await get_user_for_add(
         db, main_user_id=request.user.id, second_user_id=user_id, operation="unfriend"
     )
 
     if is_not_friend:
         raise HTTPException(detail="user is not in your friend list", status_code=403)
 
-    if second_user in main_user.friend:
-        main_user.friend.remove(second_user)
-    elif second_user in main_user.friend_by:
-        main_user.friend_by.remove(second_user)
+    if relation.friend:
+        await db.execute(
+            delete(Friend).where(
+                Friend.user_id == main_user.id, Friend.friend_user_id == second_user.id
+            )
+        )
+    elif relation.friend_by:
+        await db.execute(
+            delete(Friend).where(
+                Friend.user_id == second_user.id, Friend.friend_user_id == main_user.id
+            )
+        )
     else:
-        return main_user
+        return await with_relations(db, main_user)
 
     unfriend_notificaiton = Notification(
         sender_id=main_user.id,
@@ -358,10 +391,9 @@ async def unfriend_user(
     # close the room if connected and deactivate the room
     room = await change_room_status(main_user.id, second_user.id, mangodb, False)
     if room:
-        if str(room.id) in room_connections:
-            await room_connections[str(room.id)].close_room()
+        await publish_close_room(str(room.id))
 
-    return main_user
+    return await with_relations(db, main_user)
 
 
 @router.get("/block/{user_id}")
@@ -369,7 +401,7 @@ async def unfriend_user(
 async def block_user(
     request: Request, db: asyncdb_dependency, mangodb: mangodb_dependency, user_id: int
 ):
-    main_user, second_user, is_already_blocked = await get_user_for_add(
+    main_user, second_user, relation, is_already_blocked = await get_user_for_add(
         db,
         main_user_id=request.user.id,
         second_user_id=user_id,
@@ -377,9 +409,9 @@ async def block_user(
     )
 
     if is_already_blocked:
-        return main_user
+        return await with_relations(db, main_user)
 
-    main_user.blocked_user.append(second_user)
+    db.add(BlockedUser(user_id=main_user.id, blocked_user_id=second_user.id))
 
     block_notification = Notification(
         sender_id=main_user.id,
@@ -397,11 +429,9 @@ async def block_user(
     # close the room if connected and deactivate the room
     room = await change_room_status(main_user.id, second_user.id, mangodb, False)
     if room:
-        if str(room.id) in room_connections:
-            print("closed room: ", room.id)
-            await room_connections[str(room.id)].close_room()
+        await publish_close_room(str(room.id))
 
-    return main_user
+    return await with_relations(db, main_user)
 
 
 @router.get("/unblock/{user_id}")
@@ -409,13 +439,21 @@ async def block_user(
 async def unblock_user(
     request: Request, db: asyncdb_dependency, mangodb: mangodb_dependency, user_id: int
 ):
-    main_user = await UserQuery.one(db, request.user.id)
-    second_user = await UserQuery.one(db, user_id, False)
+    main_user = await UserQuery.one(db, request.user.id, {})
+    second_user = await UserQuery.one(db, user_id, {})
+    if second_user is None:
+        raise UserNotFoundException()
 
-    if second_user not in main_user.blocked_user:
+    relation = await UserQuery.relation_status(db, main_user.id, second_user.id)
+    if not relation.blocked_user:
         raise HTTPException(detail="user is not in your blocked list", status_code=403)
 
-    main_user.blocked_user.remove(second_user)
+    await db.execute(
+        delete(BlockedUser).where(
+            BlockedUser.user_id == main_user.id,
+            BlockedUser.blocked_user_id == second_user.id,
+        )
+    )
     unblock_notification = Notification(
         sender_id=main_user.id,
         receiver_id=second_user.id,
@@ -428,11 +466,11 @@ async def unblock_user(
 
     await send_notification_to_user(unblock_notification, main_user)
 
-    if second_user in main_user.friend or second_user in main_user.friend_by:
-        if second_user not in main_user.blocked_by:
+    if relation.is_friend:
+        if not relation.blocked_by:
             await change_room_status(main_user.id, second_user.id, mangodb, True)
 
-    return main_user
+    return await with_relations(db, main_user)
 
 
 @router.get("/search", response_model=list[FriendSearch])
@@ -451,35 +489,25 @@ async def search_user(
             status_code=400,
         )
 
-    self_user = await UserQuery.one(db, request.user.id)
+    relations = await UserQuery.relation_index(db, request.user.id)
 
     if search == "" or search_type == "":
         stmt = (
-            select(User).where(User.id != request.user.id).offset(offset).limit(limit)
+            select(User)
+            .options(raiseload("*"))
+            .where(User.id != request.user.id)
+            .offset(offset)
+            .limit(limit)
         )
         users = (await db.scalars(stmt)).unique().all()
 
-        return get_friend_search_res(users, self_user)
+        return get_friend_search_res(users, relations)
 
-    stmt = select(User)
+    # results only need the user columns, not the joined relationships
+    stmt = select(User).options(raiseload("*"))
 
     if search_type == "name":
-        if search.split(" ").__len__() == 1:
-            stmt = stmt.where(
-                User.first_name.ilike(f"%{search}%")
-                | User.last_name.ilike(f"%{search}")
-            )
-        else:
-            stmt = stmt.where(
-                (
-                    User.first_name.ilike(f"%{search.split(" ")[0]}%")
-                    & User.last_name.ilike(f"%{search.split(" ")[1]}%")
-                )
-                | (
-                    User.first_name.ilike(f"%{search.split(" ")[1]}%")
-                    & User.last_name.ilike(f"%{search.split(" ")[0]}%")
-                )
-            )
+        stmt = stmt.where(name_search_filter(search))
 
     elif search_type == "uid":
         stmt = stmt.where(User.uid == search)
@@ -495,4 +523,68 @@ async def search_user(
 
     users = (await db.scalars(stmt)).unique().all()
 
-    return get_friend_search_res(users, self_user)
+    return get_friend_search_res(users, relations)
+
+
+@router.get("/search/fuzzy", response_model=FriendSearchPage)
+@require_authentication()
+async def fuzzy_search_user(
+    request: Request,
+    db: asyncdb_dependency,
+    search: str,
+    limit: int = 10,
+    cursor: str | None = None,
+):
+    """
+    Name search ranked by trigram word similarity and served by the trigram
+    index. next_cursor holds the score and id of the last user of the page.
+    """
+    score, match = fuzzy_name_match(search)
+    stmt = (
+        select(User, score)
+        .options(raiseload("*"))
+        .where(match, User.id != request.user.id)
+    )
+
+    if cursor:
+        try:
+            after_score, after_id = cursor.split(":")
+            after_score, after_id = cast(float(after_score), REAL), int(after_id)
+        except ValueError:
+            raise HTTPException(detail="invalid cursor", status_code=400)
+        stmt = stmt.where(
+            (score < after_score) | ((score == after_score) & (User.id > after_id))
+        )
+
+    stmt = stmt.order_by(score.desc(), User.id.asc()).limit(limit)
+    rows = (await db.execute(stmt)).all()
+
+    relations = await UserQuery.relation_index(db, request.user.id)
+    next_cursor = None
+    if len(rows) == limit:
+        last_user, last_score = rows[-1]
+        next_cursor = f"{last_score}:{last_user.id}"
+
+    return FriendSearchPage(
+        users=get_friend_search_res([user for user, _ in rows], relations),
+        next_cursor=next_cursor,
+    )
+
+
+@router.post("/contacts/match", response_model=list[FriendSearch])
+@require_authentication()
+async def match_contacts(
+    request: Request, db: asyncdb_dependency, contact_book: ContactMatchRequest
+):
+    """Users registered with any of the given numbers, resolved in one query."""
+    contacts = {
+        (contact.contact_number_country_code, contact.contact_number)
+        for contact in contact_book.contacts
+    }
+    if not contacts:
+        return []
+
+    users = await match_contact_book(db, request.user.id, contacts)
+
+    relations = await UserQuery.relation_index(db, request.user.id)
+    return get_friend_search_res(users, relations)
@@ -9,6 +9,8 @@ from pydantic import (
     HttpUrl,
 )
 
+from settings import CONTACT_MATCH_LIMIT
+
 stringType = Annotated[
     str, StringConstraints(min_length=2, max_length=50, strip_whitespace=True)
 ]
@@ -114,6 +116,20 @@ class FriendSearch(UserModel):
         return v
 
 
+class ContactNumber(BaseModel):
+    contact_number_country_code: int = Field(..., ge=0)
+    contact_number: int
+
+
+class ContactMatchRequest(BaseModel):
+    contacts: list[ContactNumber] = Field(..., max_length=CONTACT_MATCH_LIMIT)
+
+
+class FriendSearchPage(BaseModel):
+    users: list[FriendSearch]
+    next_cursor: str | None = None
+
+
 class UpdateUsername(BaseModel):
     username: usernameType
     password: passwordType
@@ -1,19 +1,28 @@
 from fastapi import HTTPException
+from sqlalchemy import func, literal, literal_column, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
 from starlette import status
 
 from account.models import User
 from account.schemas import CreateUserRequest, UpdateUserRequest
-from auth.utils import bcrypt_context
+from auth.hashing import password_hasher
 from settings import SUPER_USER, HOSTNAME, STATIC
-from query import UserQuery
+from query import UserQuery, RelationStatus, RelationIndex
 from odmantic.session import AIOSession
-from message.mangomodel import ChatRoom, RoomUser
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from message.mangomodel import ChatRoom, RoomUser, friend_pair_key
+from websocket.manager.fanout import publish_room_changed
 from .schemas import FriendSearch
 
 integrity_error_fields = ["email", "username", "contact_number"]
 
+# must stay identical to the ix_users_full_name_trgm index expression, grouped
+# because custom operators like <% bind as tight as ||
+user_full_name = (User.first_name + literal_column("' '") + User.last_name).self_group()
+
 
 def extract_integrity_error(detail: str) -> str:
     for field in integrity_error_fields:
@@ -38,7 +47,7 @@ async def create_user(db: AsyncSession, user_data: CreateUserRequest):
     user_model = User(**user)
 
     user_model.is_superuser = is_superuser
-    user_model.hashed_password = bcrypt_context.hash(password)
+    user_model.hashed_password = await password_hasher.hash(password)
     db.add(user_model)
 
     try:
@@ -64,7 +73,7 @@ async def update_user_data(
         if value is not None and key != "password":
             setattr(user, key, value)
         elif value is not None and key == "password":
-            user.hashed_password = bcrypt_context.hash(value)
+            user.hashed_password = await password_hasher.hash(value)
 
     try:
         await db.commit()
@@ -80,93 +89,166 @@ async def update_user_data(
 
 async def get_user_for_add(
     db: AsyncSession, main_user_id: int, second_user_id: int, operation: str
-) -> tuple[User, User, bool]:
-    main_user = await UserQuery.one(db, main_user_id)
-    second_user = await UserQuery.one(db, second_user_id, False)
-    is_already_in_operation = False
+) -> tuple[User, User, RelationStatus, bool]:
+    main_user = await UserQuery.one(db, main_user_id, {})
+    second_user = await UserQuery.one(db, second_user_id, {})
 
     if main_user is None or second_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
+    relation = await UserQuery.relation_status(db, main_user_id, second_user_id)
     if operation == "unfriend":
-        if (
-            second_user not in main_user.friend
-            and second_user not in main_user.friend_by
-        ):
-            is_already_in_operation = True
-
+        is_already_in_operation = not relation.is_friend
     elif operation == "friend":
-        if second_user in main_user.friend or second_user in main_user.friend_by:
-            is_already_in_operation = True
+        is_already_in_operation = relation.is_friend
+    else:
+        is_already_in_operation = getattr(relation, operation)
 
-    elif second_user in getattr(main_user, operation):
-        is_already_in_operation = True
+    return main_user, second_user, relation, is_already_in_operation
 
-    return main_user, second_user, is_already_in_operation
 
+async def with_relations(db: AsyncSession, user: User) -> User:
+    """
+    Reload user with every relationship, the relationship endpoints return them
+    and the association rows are written directly, not through the lists.
+    """
+    user_id = user.id
+    db.expire(user)
+    return await UserQuery.one(db, user_id, UserQuery.all_relations)
 
-async def create_room(
-    mangodb: AIOSession, main_user_id: int, second_user_id: int, room_type: str
-) -> ChatRoom:
-    room_users = [main_user_id, second_user_id]
-    query = {"users.user_id": {"$all": room_users}}
-    room = await mangodb.find_one(ChatRoom, query)
 
-    if not room:
-        new_room = ChatRoom(
-            users=[
-                RoomUser(user_id=main_user_id, isAdmin=True),
-                RoomUser(user_id=second_user_id, isAdmin=True),
-            ],
-            type=room_type,
-            is_active=True,
-        )
+async def get_friend_room(
+    mangodb: AIOSession, first_user_id: int, second_user_id: int
+) -> ChatRoom | None:
+    """
+    Friend room of two users looked up by its pair key. A room created before
+    pair keys existed is found by its members once and gets its key set.
+    """
+    pair_key = friend_pair_key(first_user_id, second_user_id)
+    room = await mangodb.find_one(ChatRoom, ChatRoom.pair_key == pair_key)
+    if room:
+        return room
 
-        await mangodb.save(new_room)
+    query = {
+        "type": "friend",
+        "pair_key": None,
+        "users.user_id": {"$all": [first_user_id, second_user_id]},
+    }
+    room = await mangodb.find_one(ChatRoom, query)
+    if room is None:
+        return None
+    try:
+        await mangodb.engine.get_collection(ChatRoom).update_one(
+            {"_id": room.id, "pair_key": None}, {"$set": {"pair_key": pair_key}}
+        )
+    except DuplicateKeyError:
+        # another request keyed a room for the same pair first
+        return await mangodb.find_one(ChatRoom, ChatRoom.pair_key == pair_key)
+    room.pair_key = pair_key
+    return room
 
-        return new_room
 
-    room.is_active = True
+async def create_room(
+    mangodb: AIOSession, main_user_id: int, second_user_id: int, room_type: str
+) -> ChatRoom:
+    if room_type != "friend":
+        raise ValueError("only friend rooms are created between two users")
+
+    await get_friend_room(mangodb, main_user_id, second_user_id)
+
+    # upsert on the unique pair key, concurrent accepts end up on the same room
+    pair_key = friend_pair_key(main_user_id, second_user_id)
+    new_room = ChatRoom(
+        users=[
+            RoomUser(user_id=main_user_id, isAdmin=True),
+            RoomUser(user_id=second_user_id, isAdmin=True),
+        ],
+        type=room_type,
+        is_active=True,
+        pair_key=pair_key,
+    ).model_dump_doc()
+    del new_room["is_active"]
+
+    collection = mangodb.engine.get_collection(ChatRoom)
+    for attempt in range(2):
+        try:
+            room = await collection.find_one_and_update(
+                {"pair_key": pair_key},
+                {"$setOnInsert": new_room, "$set": {"is_active": True}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            break
+        except DuplicateKeyError:
+            if attempt:
+                raise
 
-    await mangodb.save(room)
+    await publish_room_changed(str(room["_id"]))
 
-    return room
+    return ChatRoom.model_validate_doc(room)
 
 
 async def change_room_status(
     main_user, second_user, mangodb: AIOSession, status: bool
 ) -> ChatRoom | None:
-    room_users = [main_user, second_user]
-    query = {"users.user_id": {"$all": room_users}}
-    room = await mangodb.find_one(ChatRoom, query)
+    room = await get_friend_room(mangodb, main_user, second_user)
     if room:
         if room.is_active != status:
             room.is_active = status
             await mangodb.save(room)
+            await publish_room_changed(str(room.id))
 
     return room
 
 
-def get_friend_search_res(users: list[User], self_user: User):
-    response = []
-    for usr in users:
-        if usr in self_user.friend or usr in self_user.friend_by:
-            status = "friend"
-        elif usr in self_user.requested_user:
-            status = "requested"
-        elif usr in self_user.requested_by:
-            status = "requested_by"
-        elif usr in self_user.blocked_user:
-            status = "blocked"
-        else:
-            status = "none"
-
-        response.append(
-            FriendSearch(
-                **usr.__dict__,
-                friend_status=status,
-            )
+def name_search_filter(search: str):
+    """ilike match of a first name, a last name or both in either order."""
+    words = search.split(" ")
+    if len(words) == 1:
+        return User.first_name.ilike(f"%{search}%") | User.last_name.ilike(f"%{search}")
+    first, second = words[0], words[1]
+    return (
+        User.first_name.ilike(f"%{first}%") & User.last_name.ilike(f"%{second}%")
+    ) | (User.first_name.ilike(f"%{second}%") & User.last_name.ilike(f"%{first}%"))
+
+
+def fuzzy_name_match(search: str):
+    """
+    Trigram word similarity of search to the full name, and the filter on it
+    that the ix_users_full_name_trgm index serves.
+    """
+    return (
+        func.word_similarity(search, user_full_name),
+        literal(search).op("<%")(user_full_name),
+    )
+
+
+async def match_contact_book(
+    db: AsyncSession, user_id: int, contacts: set[tuple[int, int]]
+) -> list[User]:
+    """
+    Users other than user_id registered with any of the (country code, number)
+    contacts, in one query on the contact_number index.
+    """
+    stmt = (
+        select(User)
+        .options(raiseload("*"))
+        .where(
+            User.contact_number.in_(list({number for _, number in contacts})),
+            User.id != user_id,
         )
-    return response
+    )
+    return [
+        usr
+        for usr in (await db.scalars(stmt)).all()
+        if (usr.contact_number_country_code, usr.contact_number) in contacts
+    ]
+
+
+def get_friend_search_res(users: list[User], relations: RelationIndex):
+    return [
+        FriendSearch(**usr.__dict__, friend_status=relations.search_status(usr.id))
+        for usr in users
+    ]
@@ -0,0 +1,75 @@
+"""Notification created_at to timestamp
+
+Revision ID: 5d0c7a9e3f21
+Revises: 8bfeb67e4014
+Create Date: 2026-10-18 10:30:12.418305
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5d0c7a9e3f21"
+down_revision: Union[str, None] = "8bfeb67e4014"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+batch_size = 10000
+
+# legacy "%b %d %Y %I:%M:%S %p" strings were written in kathmandu time
+legacy_format = "Mon DD YYYY HH12:MI:SS AM"
+
+
+def upgrade() -> None:
+    # every batch is committed on its own, an interrupted run resumes from the
+    # rows that are still NULL in created_at_utc.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "ALTER TABLE notifications "
+            "ADD COLUMN IF NOT EXISTS created_at_utc TIMESTAMP WITH TIME ZONE"
+        )
+        while True:
+            result = op.get_bind().execute(
+                sa.text(
+                    "UPDATE notifications SET created_at_utc = "
+                    "to_timestamp(created_at, :format)::timestamp "
+                    "AT TIME ZONE 'Asia/Kathmandu' "
+                    "WHERE id IN (SELECT id FROM notifications "
+                    "WHERE created_at_utc IS NULL LIMIT :batch_size)"
+                ),
+                {"format": legacy_format, "batch_size": batch_size},
+            )
+            if result.rowcount == 0:
+                break
+
+    op.drop_column("notifications", "created_at")
+    op.alter_column(
+        "notifications",
+        "created_at_utc",
+        new_column_name="created_at",
+        nullable=False,
+        server_default=sa.func.now(),
+    )
+
+
+def downgrade() -> None:
+    op.add_column(
+        "notifications",
+        sa.Column("created_at_legacy", sa.VARCHAR(), nullable=True),
+    )
+    op.execute(
+        sa.text(
+            "UPDATE notifications SET created_at_legacy = "
+            "to_char(created_at AT TIME ZONE 'Asia/Kathmandu', :format)"
+        ).bindparams(format=legacy_format)
+    )
+    op.drop_column("notifications", "created_at")
+    op.alter_column(
+        "notifications",
+        "created_at_legacy",
+        new_column_name="created_at",
+        nullable=False,
+    )
@@ -0,0 +1,33 @@
+"""Relationship pair indexes
+
+Revision ID: a3c91e5b7d42
+Revises: 5d0c7a9e3f21
+Create Date: 2026-10-18 14:05:41.902117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a3c91e5b7d42"
+down_revision: Union[str, None] = "5d0c7a9e3f21"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_BlockedUser_pair", "BlockedUser", ["user_id", "blocked_user_id"]
+    )
+    op.create_index(
+        "ix_RequestedUser_pair", "RequestedUser", ["user_id", "requested_user_id"]
+    )
+    op.create_index("ix_Friend_pair", "Friend", ["user_id", "friend_user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_Friend_pair", table_name="Friend")
+    op.drop_index("ix_RequestedUser_pair", table_name="RequestedUser")
+    op.drop_index("ix_BlockedUser_pair", table_name="BlockedUser")
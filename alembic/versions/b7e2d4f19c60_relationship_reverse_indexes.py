@@ -0,0 +1,34 @@
+"""Relationship reverse indexes
+
+Revision ID: b7e2d4f19c60
+Revises: a3c91e5b7d42
+Create Date: 2026-10-18 15:12:08.337410
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e2d4f19c60"
+down_revision: Union[str, None] = "a3c91e5b7d42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the pair indexes lead with user_id, these serve the *_by lookups
+    op.create_index(
+        "ix_BlockedUser_blocked_user_id", "BlockedUser", ["blocked_user_id"]
+    )
+    op.create_index(
+        "ix_RequestedUser_requested_user_id", "RequestedUser", ["requested_user_id"]
+    )
+    op.create_index("ix_Friend_friend_user_id", "Friend", ["friend_user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_Friend_friend_user_id", table_name="Friend")
+    op.drop_index("ix_RequestedUser_requested_user_id", table_name="RequestedUser")
+    op.drop_index("ix_BlockedUser_blocked_user_id", table_name="BlockedUser")
@@ -0,0 +1,32 @@
+"""Users full name trigram index
+
+Revision ID: c4f8a2e6d913
+Revises: b7e2d4f19c60
+Create Date: 2026-10-18 16:40:27.615093
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f8a2e6d913"
+down_revision: Union[str, None] = "b7e2d4f19c60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # the expression must match account.utils.user_full_name to be used
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_full_name_trgm "
+            "ON users USING gin ((first_name || ' ' || last_name) gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_full_name_trgm")
@@ -36,3 +36,8 @@ class AdminRequiredException(AuthException):
 class UserNotFoundException(AuthException):
     status_code = status.HTTP_404_NOT_FOUND
     details = "User not found"
+
+
+class HashingBusyException(AuthException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    details = "Too many password requests, try again later"
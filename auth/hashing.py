@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from passlib.context import CryptContext
+from passlib.registry import get_crypt_handler
+
+from logger import logger
+from settings import PASSWORD_HASHING
+from .exceptions import HashingBusyException
+
+T = TypeVar("T")
+
+
+# the only scheme whose passlib default cost is used without PASSWORD_HASH_ROUNDS
+default_scheme = "bcrypt"
+
+
+def scheme_rounds(scheme: str, rounds: int | None) -> int | None:
+    """
+    Cost of scheme, rounds mean iterations for linear schemes and log2
+    iterations for bcrypt. Any other scheme than default_scheme needs an
+    explicit cost, and costs outside the handler range are rejected.
+    """
+    handler = get_crypt_handler(scheme)
+    if "rounds" not in handler.setting_kwds:
+        if rounds is not None:
+            raise ValueError(f"{scheme} has no configurable cost")
+        return None
+    if rounds is None:
+        if scheme != default_scheme:
+            raise ValueError(
+                f"set PASSWORD_HASH_ROUNDS for {scheme}, "
+                f"see python -m auth.hashing calibrate --scheme {scheme}"
+            )
+        return handler.default_rounds
+    if not handler.min_rounds <= rounds <= handler.max_rounds:
+        raise ValueError(
+            f"{scheme} rounds must be between {handler.min_rounds} "
+            f"and {handler.max_rounds}, got {rounds}"
+        )
+    return rounds
+
+
+def build_context(
+    scheme: str, rounds: int | None, legacy_schemes: list[str]
+) -> CryptContext:
+    """
+    Context hashing with scheme at exactly its cost. Legacy schemes still
+    verify, but their hashes and hashes of another cost need an update.
+    """
+    rounds = scheme_rounds(scheme, rounds)
+    settings = {}
+    if rounds is not None:
+        settings = {
+            f"{scheme}__default_rounds": rounds,
+            f"{scheme}__min_rounds": rounds,
+            f"{scheme}__max_rounds": rounds,
+        }
+    return CryptContext(
+        schemes=[scheme, *(legacy for legacy in legacy_schemes if legacy != scheme)],
+        deprecated="auto",
+        **settings,
+    )
+
+
+bcrypt_context = build_context(
+    PASSWORD_HASHING["SCHEME"],
+    PASSWORD_HASHING["ROUNDS"],
+    PASSWORD_HASHING["LEGACY_SCHEMES"],
+)
+if (
+    PASSWORD_HASHING["ROUNDS"] is not None
+    and PASSWORD_HASHING["ROUNDS"]
+    < get_crypt_handler(PASSWORD_HASHING["SCHEME"]).default_rounds
+):
+    logger.warning(
+        f"{PASSWORD_HASHING['SCHEME']} runs below the passlib default cost "
+        f"with PASSWORD_HASH_ROUNDS={PASSWORD_HASHING['ROUNDS']}"
+    )
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small thread pool so a hash or verify never blocks the
+    event loop. At most max_workers calls run and max_pending wait, any call
+    past that is rejected right away instead of queueing behind the others.
+    """
+
+    def __init__(
+        self, context: CryptContext, max_workers: int, max_pending: int
+    ) -> None:
+        self.context = context
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="password")
+        self.limit = max_workers + max_pending
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            raise HashingBusyException()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, func, *args
+            )
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self.run(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        """Verify, and return a new hash when the stored one is outdated."""
+        return await self.run(self.context.verify_and_update, password, hashed_password)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "rejected": self.rejected}
+
+
+password_hasher = PasswordHasher(
+    bcrypt_context, PASSWORD_HASHING["WORKERS"], PASSWORD_HASHING["MAX_PENDING"]
+)
+
+
+def measure_verify(scheme: str, rounds: int | None, samples: int = 3) -> float:
+    """Milliseconds one verify takes on this host."""
+    context = build_context(scheme, rounds, [])
+    hashed = context.hash("calibration")
+    start = time.perf_counter()
+    for _ in range(samples):
+        context.verify("calibration", hashed)
+    return (time.perf_counter() - start) * 1000 / samples
+
+
+def calibrate(scheme: str, target_ms: float) -> int:
+    """
+    Highest cost of scheme whose verify stays within target_ms on this host.
+    The search starts from the handler default, one log2 step at a time for
+    bcrypt and scaled by the measured time for linear schemes.
+    """
+    handler = get_crypt_handler(scheme)
+    if "rounds" not in handler.setting_kwds:
+        raise ValueError(f"{scheme} has no configurable cost")
+
+    def timed(rounds: int) -> float:
+        elapsed = measure_verify(scheme, rounds)
+        logger.info(f"{scheme} rounds {rounds}: {elapsed:.1f} ms")
+        return elapsed
+
+    rounds = handler.default_rounds
+    elapsed = timed(rounds)
+    if handler.rounds_cost == "log2":
+        if elapsed > target_ms:
+            while elapsed > target_ms and rounds > handler.min_rounds:
+                rounds -= 1
+                elapsed = timed(rounds)
+        else:
+            while rounds < handler.max_rounds:
+                candidate_elapsed = timed(rounds + 1)
+                if candidate_elapsed > target_ms:
+                    break
+                rounds, elapsed = rounds + 1, candidate_elapsed
+    else:
+        for _ in range(3):
+            candidate = int(rounds * target_ms / elapsed)
+            candidate = min(max(candidate, handler.min_rounds), handler.max_rounds)
+            if candidate == rounds:
+                break
+            rounds, elapsed = candidate, timed(candidate)
+        while elapsed > target_ms and rounds > handler.min_rounds:
+            rounds = max(int(rounds * 0.9), handler.min_rounds)
+            elapsed = timed(rounds)
+
+    if elapsed > target_ms:
+        logger.warning(f"{scheme} takes {elapsed:.1f} ms even at its lowest cost")
+    elif rounds < handler.default_rounds:
+        logger.warning(
+            f"{scheme} rounds {rounds} is below the passlib default of "
+            f"{handler.default_rounds}"
+        )
+    return rounds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="password hashing policy")
+    parser.add_argument("command", choices=("calibrate",))
+    parser.add_argument("--scheme", default=PASSWORD_HASHING["SCHEME"])
+    parser.add_argument("--target-ms", type=float, default=250)
+    args = parser.parse_args()
+    rounds = calibrate(args.scheme, args.target_ms)
+    logger.info(f"suggested PASSWORD_HASH_ROUNDS={rounds}")
@@ -1,19 +1,32 @@
+import pymongo
 from odmantic import Model, Field
 from datetime import datetime
+from message.mangomodel import utc_now
 from settings import JWT
 
 
+def expires_at_ttl_index() -> pymongo.IndexModel:
+    # mongo removes the document as soon as expires_at (utc) has passed
+    return pymongo.IndexModel(
+        [("expires_at", pymongo.ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0
+    )
+
+
 class OutstandingRefreshToken(Model):
-    created_at: datetime = Field(default_factory=datetime.now)
+    created_at: datetime = Field(default_factory=utc_now)
     expires_at: datetime = Field(
-        default_factory=lambda: datetime.now() + JWT["REFRESH_TOKEN_EXPIRES"]
+        default_factory=lambda: utc_now() + JWT["REFRESH_TOKEN_EXPIRES"]
     )
-    token: str
-    user_id: int
+    token: str = Field(index=True)
+    user_id: int = Field(index=True)
+
+    model_config = {"indexes": lambda: [expires_at_ttl_index()]}
 
 
 class BlackListedRefreshToken(Model):
-    blacklisted_at: datetime = Field(default_factory=datetime.now)
+    blacklisted_at: datetime = Field(default_factory=utc_now)
     expires_at: datetime
-    token: str
-    user_id: int
+    token: str = Field(index=True)
+    user_id: int = Field(index=True)
+
+    model_config = {"indexes": lambda: [expires_at_ttl_index()]}
@@ -33,7 +33,7 @@ async def refresh_token(
     db: asyncdb_dependency, mangodb: mangodb_dependency, form_data: RefreshToken
 ):
     ref_token = await Token.verify_refresh_token(mangodb, form_data.token)
-    user = await UserQuery.one(db, ref_token["id"])
+    user = await UserQuery.one(db, ref_token["id"], {})
     new_token = Token(user).get_token()
     await Token.save_refresh_token_to_blacklist(mangodb, form_data.token, user.id)
     await Token.save_refresh_token_to_outstanding(
@@ -65,6 +65,6 @@ async def outstanding_token(request: Request, mangodb: mangodb_dependency):
 async def delete_tokens(
     request: Request, db: asyncdb_dependency, mongodb: mangodb_dependency
 ):
-    user = await UserQuery.one(db, request.user.id, False)
+    user = await UserQuery.one(db, request.user.id, {})
     data = await Token.delete_all_tokens(mongodb, user.id)
     return data
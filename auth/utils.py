@@ -2,7 +2,6 @@ from datetime import datetime, timezone
 
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError, ExpiredSignatureError
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from account.models import User
@@ -21,9 +20,11 @@ from .mangomodel import (
 from settings import JWT
 from odmantic.session import AIOSession
 from odmantic.exceptions import DocumentNotFoundError
-from odmantic import Model
+from odmantic import Model, AIOEngine
+from logger import logger
+from message.mangomodel import utc_now
+from .hashing import password_hasher
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
@@ -33,9 +34,18 @@ def check_account_status(acc_status: str):
 
 
 async def authenticate_user(db: AsyncSession, username: str, password: str):
-    user = (await UserQuery(db, {"username": username}).get_data()).one_or_none()
-    if not user or not bcrypt_context.verify(password, user.hashed_password):
+    user = (await UserQuery(db, {"username": username}, {}).get_data()).one_or_none()
+    if not user:
         raise IncorrectCredentialsException()
+    valid, new_hash = await password_hasher.verify_and_update(
+        password, user.hashed_password
+    )
+    if not valid:
+        raise IncorrectCredentialsException()
+    if new_hash:
+        # stored hash used an old scheme or cost
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 
@@ -46,6 +56,20 @@ async def token_document_delete(mangodb: AIOSession, document: Model):
         raise InvalidTokenException()
 
 
+async def sweep_expired_tokens(engine: AIOEngine) -> dict[str, int]:
+    """
+    Remove expired refresh tokens right away. The ttl index handles expiry from
+    then on, this clears rows that were written before the index existed.
+    """
+    removed = {}
+    for model in (OutstandingRefreshToken, BlackListedRefreshToken):
+        removed[model.__collection__] = await engine.remove(
+            model, model.expires_at < utc_now()
+        )
+    logger.info(f"expired refresh tokens removed: {removed}")
+    return removed
+
+
 class Token:
     # must be field name of User model
     extra_encode_fields = [
@@ -157,14 +181,16 @@ class Token:
         outstanding_tokens = await mangodb.find(
             OutstandingRefreshToken, OutstandingRefreshToken.user_id == user_id
         )
-        for t in outstanding_tokens:
-            await token_document_delete(mangodb, t)
+        await mangodb.remove(
+            OutstandingRefreshToken, OutstandingRefreshToken.user_id == user_id
+        )
 
         blacklisted_tokens = await mangodb.find(
             BlackListedRefreshToken, BlackListedRefreshToken.user_id == user_id
         )
-        for t in blacklisted_tokens:
-            await token_document_delete(mangodb, t)
+        await mangodb.remove(
+            BlackListedRefreshToken, BlackListedRefreshToken.user_id == user_id
+        )
 
         return {
             "user_id": user_id,
@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import random
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import raiseload
+
+from account.models import Friend, User
+from account.schemas import FriendSearch
+from account.utils import get_friend_search_res, match_contact_book
+from logger import logger
+from query import UserQuery
+from .relation_search import list_search_res
+from .utils import (
+    median_ms,
+    required_url,
+    seed_relation,
+    seed_users,
+    throwaway_postgres,
+)
+
+user_id = 1
+# seed_users gives user i the number 9800000000 + i with the default country code
+country_code = 977
+first_number = 9_800_000_000
+
+
+async def seed(sessions: async_sessionmaker, users: int, friends: int) -> None:
+    async with sessions() as db:
+        await seed_users(db, users)
+        await seed_relation(
+            db,
+            Friend,
+            [user_id] * friends,
+            list(range(user_id + 1, user_id + 1 + friends)),
+        )
+
+
+def contact_book(users: int, numbers: int, registered: float) -> list[tuple[int, int]]:
+    """numbers contacts, the registered share of them belongs to seeded users."""
+    matching = min(int(numbers * registered), users - 1)
+    contacts = [
+        (country_code, first_number + other_id)
+        for other_id in random.sample(range(user_id + 1, users + 1), matching)
+    ]
+    contacts += [
+        (country_code, first_number + users + 1 + index)
+        for index in range(numbers - matching)
+    ]
+    random.shuffle(contacts)
+    return contacts
+
+
+async def search_per_number(
+    sessions: async_sessionmaker, contacts: list[tuple[int, int]]
+) -> list[FriendSearch]:
+    """The old path, a contact search per number that reloads the caller."""
+    response = []
+    async with sessions() as db:
+        for _, number in contacts:
+            self_user = await UserQuery.one(db, user_id)
+            stmt = select(User).where(User.contact_number == number).offset(0).limit(10)
+            users = (await db.scalars(stmt)).unique().all()
+            response += list_search_res(users, self_user)
+    return response
+
+
+async def match_once(
+    sessions: async_sessionmaker, contacts: list[tuple[int, int]]
+) -> list[FriendSearch]:
+    """The /account/contacts/match path."""
+    async with sessions() as db:
+        users = await match_contact_book(db, user_id, set(contacts))
+        relations = await UserQuery.relation_index(db, user_id)
+        return get_friend_search_res(users, relations)
+
+
+async def measure(
+    sessions: async_sessionmaker, contacts: list[tuple[int, int]], repeat: int
+) -> dict[str, tuple[float, int]]:
+    """Median milliseconds of matching contacts on both paths, and the matches."""
+    old = await search_per_number(sessions, contacts)
+    new = await match_once(sessions, contacts)
+    assert sorted((usr.id, usr.friend_status) for usr in old) == sorted(
+        (usr.id, usr.friend_status) for usr in new
+    )
+    return {
+        "search per number": (
+            await median_ms(lambda: search_per_number(sessions, contacts), repeat),
+            len(old),
+        ),
+        "one match query": (
+            await median_ms(lambda: match_once(sessions, contacts), repeat),
+            len(new),
+        ),
+    }
+
+
+async def main(
+    users: int, friends: int, numbers: int, registered: float, repeat: int
+) -> None:
+    async with throwaway_postgres(required_url("TEST_DATABASE_URL")) as sessions:
+        await seed(sessions, users, friends)
+        logger.info(f"seeded {users} users, the caller has {friends} friends")
+        contacts = contact_book(users, numbers, registered)
+        results = await measure(sessions, contacts, repeat)
+    for name, (elapsed, matches) in results.items():
+        logger.info(
+            f"{numbers} contacts with {name}: {elapsed:.1f} ms, {matches} matches"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="contact book matching, search per number vs one query"
+    )
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--friends", type=int, default=20)
+    parser.add_argument("--numbers", type=int, default=5_000)
+    parser.add_argument("--registered", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(
+        main(args.users, args.friends, args.numbers, args.registered, args.repeat)
+    )
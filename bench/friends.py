@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from account.models import BlockedUser, Friend, RequestedUser
+from logger import logger
+from query import UserQuery
+from .utils import (
+    median_ms,
+    required_url,
+    seed_relation,
+    seed_users,
+    throwaway_postgres,
+)
+
+user_id = 1
+
+
+async def seed(
+    sessions: async_sessionmaker, friends: int, requests: int, blocked: int
+) -> None:
+    """
+    user_id with friends friends, requests requests in each direction and
+    blocked blocked users, every one of them a different user.
+    """
+    related = list(range(user_id + 1, user_id + 1 + friends + 2 * requests + blocked))
+    friend_ids = related[:friends]
+    requested_ids = related[friends : friends + requests]
+    requested_by_ids = related[friends + requests : friends + 2 * requests]
+    blocked_ids = related[friends + 2 * requests :]
+
+    async with sessions() as db:
+        await seed_users(db, 1 + len(related))
+        await seed_relation(db, Friend, [user_id] * friends, friend_ids)
+        await seed_relation(db, RequestedUser, [user_id] * requests, requested_ids)
+        await seed_relation(db, RequestedUser, requested_by_ids, [user_id] * requests)
+        await seed_relation(db, BlockedUser, [user_id] * blocked, blocked_ids)
+
+
+async def measure(sessions: async_sessionmaker, repeat: int) -> dict[str, float]:
+    """Median milliseconds of loading user_id in each way, in a fresh session."""
+    loaders = {
+        "every relationship joined": lambda db: UserQuery.one(db, user_id),
+        "every relationship selectin": lambda db: UserQuery.one(
+            db, user_id, UserQuery.all_relations
+        ),
+        "friend selectin": lambda db: UserQuery.one(
+            db, user_id, {"friend": "selectin"}
+        ),
+        "no relationship": lambda db: UserQuery.one(db, user_id, {}),
+        "relation index": lambda db: UserQuery.relation_index(db, user_id),
+    }
+
+    results = {}
+    for name, loader in loaders.items():
+
+        async def load():
+            async with sessions() as db:
+                return await loader(db)
+
+        results[name] = await median_ms(load, repeat)
+    return results
+
+
+async def main(friends: int, requests: int, blocked: int, repeat: int) -> None:
+    async with throwaway_postgres(required_url("TEST_DATABASE_URL")) as sessions:
+        await seed(sessions, friends, requests, blocked)
+        logger.info(
+            f"seeded a user with {friends} friends, {requests} requests each way "
+            f"and {blocked} blocked users"
+        )
+        results = await measure(sessions, repeat)
+    for name, elapsed in results.items():
+        logger.info(f"{name}: {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="loading a user with many friends by relationship strategy"
+    )
+    parser.add_argument("--friends", type=int, default=1_000)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--blocked", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.friends, args.requests, args.blocked, args.repeat))
@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+
+from odmantic import AIOEngine
+
+from database.indexes import sync_indexes
+from logger import logger
+from message.mangomodel import (
+    ChatRoom,
+    Message,
+    ReadWatermark,
+    RoomSummary,
+    RoomUser,
+    friend_pair_key,
+)
+from message.utils import history_pipeline
+from .utils import median_ms, required_url, throwaway_mongo
+
+user_id = 1
+
+
+async def insert(engine: AIOEngine, model, documents: list, batch: int) -> None:
+    collection = engine.get_collection(model)
+    for start in range(0, len(documents), batch):
+        await collection.insert_many(documents[start : start + batch], ordered=False)
+
+
+async def seed(
+    engine: AIOEngine,
+    rooms: int,
+    messages_per_room: int,
+    other_rooms: int,
+    batch: int = 10_000,
+) -> None:
+    """
+    user_id in rooms friend rooms with their messages, summaries and, for every
+    other room, the friend's watermark on the last message. The other rooms
+    only hold other users.
+    """
+    await sync_indexes(engine, [ChatRoom, Message, RoomSummary, ReadWatermark])
+    room_docs, message_docs, summary_docs, watermark_docs = [], [], [], []
+    for index in range(rooms + other_rooms):
+        if index < rooms:
+            members = [user_id, 1_000 + index]
+        else:
+            members = [1_000 + index, 2_000_000 + index]
+        room = ChatRoom(
+            users=[RoomUser(user_id=member, isAdmin=False) for member in members],
+            type="friend",
+            is_active=True,
+            pair_key=friend_pair_key(*members),
+        )
+        room_docs.append(room.model_dump_doc())
+        if index >= rooms or not messages_per_room:
+            continue
+
+        messages = [
+            Message(
+                room_id=str(room.id),
+                sender_id=members[position % 2],
+                message_text=f"message {position}",
+            )
+            for position in range(messages_per_room)
+        ]
+        message_docs.extend(message.model_dump_doc() for message in messages)
+        last = messages[-1]
+        summary_docs.append(
+            RoomSummary(
+                room_id=str(room.id),
+                last_message_id=last.id,
+                preview=last.message_text,
+                last_message_at=last.created_at,
+                unread={str(member): messages_per_room // 2 for member in members},
+            ).model_dump_doc()
+        )
+        if index % 2:
+            watermark_docs.append(
+                ReadWatermark(
+                    room_id=str(room.id), user_id=members[1], last_read_id=last.id
+                ).model_dump_doc()
+            )
+
+    await insert(engine, ChatRoom, room_docs, batch)
+    await insert(engine, Message, message_docs, batch)
+    await insert(engine, RoomSummary, summary_docs, batch)
+    await insert(engine, ReadWatermark, watermark_docs, batch)
+
+
+async def per_room_history(engine: AIOEngine) -> list:
+    """The old path, the last five messages of every room in a query each."""
+    results = []
+    for room in await engine.find(ChatRoom, {"users.user_id": user_id}):
+        messages = await engine.find(
+            Message,
+            Message.room_id == str(room.id),
+            limit=5,
+            sort=Message.id.desc(),
+        )
+        quantity = sum(
+            1
+            for message in messages
+            if message.status != "seen" and message.sender_id != user_id
+        )
+        results.append((room, messages[0] if messages else None, quantity))
+    results.sort(key=lambda result: (result[1] or result[0]).created_at, reverse=True)
+    return results
+
+
+async def aggregated_history(engine: AIOEngine) -> list:
+    """The current path, history_pipeline in one round trip."""
+    collection = engine.get_collection(ChatRoom)
+    results = []
+    for room in await collection.aggregate(history_pipeline(user_id)).to_list(
+        length=None
+    ):
+        message = room.pop("message", None)
+        quantity = room.pop("quantity")
+        if message and room.pop("read_by"):
+            message["status"] = "seen"
+        results.append(
+            (
+                ChatRoom.model_validate_doc(room),
+                Message.model_validate_doc(message) if message else None,
+                quantity,
+            )
+        )
+    return results
+
+
+async def measure(engine: AIOEngine, rooms: int, repeat: int) -> tuple[float, float]:
+    """Median milliseconds of the history of user_id, old and current path."""
+    old = await per_room_history(engine)
+    new = await aggregated_history(engine)
+    assert len(old) == len(new) == rooms
+    assert {room.id for room, _, _ in old} == {room.id for room, _, _ in new}
+
+    old_ms = await median_ms(lambda: per_room_history(engine), repeat)
+    new_ms = await median_ms(lambda: aggregated_history(engine), repeat)
+    return old_ms, new_ms
+
+
+async def main(
+    rooms: int, messages_per_room: int, other_rooms: int, repeat: int
+) -> None:
+    async with throwaway_mongo(required_url("TEST_MANGODB_URL")) as engine:
+        await seed(engine, rooms, messages_per_room, other_rooms)
+        logger.info(
+            f"seeded {rooms} rooms of {messages_per_room} messages for the user "
+            f"and {other_rooms} other rooms"
+        )
+        old_ms, new_ms = await measure(engine, rooms, repeat)
+    logger.info(
+        f"history of {rooms} rooms: query per room {old_ms:.1f} ms, "
+        f"aggregation {new_ms:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="chat history latency, query per room vs one aggregation"
+    )
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--messages-per-room", type=int, default=20)
+    parser.add_argument("--other-rooms", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.rooms, args.messages_per_room, args.other_rooms, args.repeat))
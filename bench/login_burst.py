@@ -0,0 +1,114 @@
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+
+from auth.hashing import PasswordHasher, bcrypt_context, build_context
+from logger import logger
+from settings import PASSWORD_HASHING
+
+password = "benchmark-password"
+
+
+def build_app(context: CryptContext, hasher: PasswordHasher) -> FastAPI:
+    """An echo websocket next to a login verifying inline or on the hasher."""
+    app = FastAPI()
+    hashed_password = context.hash(password)
+
+    @app.websocket("/echo")
+    async def echo(websocket: WebSocket):
+        await websocket.accept()
+        try:
+            while True:
+                await websocket.send_text(await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+
+    @app.post("/login/inline")
+    async def login_inline():
+        return {"valid": context.verify(password, hashed_password)}
+
+    @app.post("/login/pooled")
+    async def login_pooled():
+        return {"valid": await hasher.verify(password, hashed_password)}
+
+    return app
+
+
+def p99(samples: list[float]) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[98]
+
+
+def run(
+    mode: str, logins: int, pings: int, interval_ms: float, context: CryptContext
+) -> dict:
+    """
+    Websocket round trips in milliseconds while idle and while logins
+    concurrent logins verify their password inline or on the hasher.
+    """
+    hasher = PasswordHasher(
+        context, PASSWORD_HASHING["WORKERS"], PASSWORD_HASHING["MAX_PENDING"]
+    )
+    app = build_app(context, hasher)
+    try:
+        with TestClient(app) as client, client.websocket_connect("/echo") as websocket:
+
+            def ping() -> float:
+                start = time.perf_counter()
+                websocket.send_text("ping")
+                websocket.receive_text()
+                time.sleep(interval_ms / 1000)
+                return (time.perf_counter() - start) * 1000 - interval_ms
+
+            idle = [ping() for _ in range(pings)]
+            with ThreadPoolExecutor(logins) as pool:
+                responses = [
+                    pool.submit(client.post, f"/login/{mode}") for _ in range(logins)
+                ]
+                burst = [ping()]
+                while not all(response.done() for response in responses):
+                    burst.append(ping())
+            statuses = [response.result().status_code for response in responses]
+    finally:
+        hasher.close()
+
+    return {
+        "idle_p99": p99(idle),
+        "burst_p99": p99(burst) if len(burst) > 1 else burst[0],
+        "burst_max": max(burst),
+        "pings": len(burst),
+        "ok": statuses.count(200),
+        "rejected": statuses.count(503),
+    }
+
+
+def main(logins: int, pings: int, interval_ms: float, rounds: int | None) -> None:
+    context = bcrypt_context
+    if rounds is not None:
+        context = build_context(PASSWORD_HASHING["SCHEME"], rounds, [])
+    for mode in ("inline", "pooled"):
+        result = run(mode, logins, pings, interval_ms, context)
+        logger.info(
+            f"{mode}: websocket p99 {result['idle_p99']:.2f} ms idle, "
+            f"{result['burst_p99']:.2f} ms during {logins} logins "
+            f"(max {result['burst_max']:.2f} ms over {result['pings']} pings), "
+            f"{result['ok']} logins ok, {result['rejected']} rejected"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="websocket latency during a login burst, inline vs pooled hashing"
+    )
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--pings", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument(
+        "--rounds", type=int, default=None, help="cost instead of the configured one"
+    )
+    args = parser.parse_args()
+    main(args.logins, args.pings, args.interval_ms, args.rounds)
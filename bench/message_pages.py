@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+
+from bson import ObjectId
+from odmantic import AIOEngine
+
+from database.indexes import sync_indexes
+from logger import logger
+from message.mangomodel import Message, utc_now
+from .utils import median_ms, required_url, throwaway_mongo
+
+room_id = "bench-room"
+
+
+async def seed(engine: AIOEngine, messages: int, batch: int = 10_000) -> None:
+    """messages messages in room_id, ids increase with insertion order."""
+    collection = engine.get_collection(Message)
+    await sync_indexes(engine, [Message])
+    for start in range(0, messages, batch):
+        await collection.insert_many(
+            [
+                {
+                    "_id": ObjectId(),
+                    "room_id": room_id,
+                    "sender_id": index % 2,
+                    "message_text": f"message {index}",
+                    "message_type": "text",
+                    "created_at": utc_now(),
+                    "status": "sent",
+                    "seen_by": [],
+                }
+                for index in range(start, min(start + batch, messages))
+            ],
+            ordered=False,
+        )
+
+
+async def offset_page(engine: AIOEngine, depth: int, limit: int) -> list[Message]:
+    return await engine.find(
+        Message,
+        Message.room_id == room_id,
+        limit=limit,
+        skip=depth,
+        sort=Message.id.desc(),
+    )
+
+
+async def keyset_page(
+    engine: AIOEngine, before_id: ObjectId, limit: int
+) -> list[Message]:
+    return await engine.find(
+        Message,
+        (Message.room_id == room_id) & (Message.id < before_id),
+        limit=limit,
+        sort=Message.id.desc(),
+    )
+
+
+async def measure(
+    engine: AIOEngine, depths: list[int], limit: int, repeat: int
+) -> dict[int, tuple[float, float]]:
+    """
+    Median milliseconds of the page depth messages back from the newest, read
+    with offset and with the before_id cursor a client scrolling there holds.
+    """
+    results = {}
+    for depth in depths:
+        if depth == 0:
+            cursor = ObjectId("f" * 24)
+        else:
+            # the last message of the page before, where the cursor points
+            (cursor_message,) = await offset_page(engine, depth - 1, 1)
+            cursor = cursor_message.id
+
+        offset_ms = await median_ms(lambda: offset_page(engine, depth, limit), repeat)
+        keyset_ms = await median_ms(lambda: keyset_page(engine, cursor, limit), repeat)
+        offset_ids = [message.id for message in await offset_page(engine, depth, limit)]
+        keyset_ids = [
+            message.id for message in await keyset_page(engine, cursor, limit)
+        ]
+        assert offset_ids == keyset_ids
+        results[depth] = (offset_ms, keyset_ms)
+    return results
+
+
+async def main(messages: int, depths: list[int], limit: int, repeat: int) -> None:
+    async with throwaway_mongo(required_url("TEST_MANGODB_URL")) as engine:
+        await seed(engine, messages)
+        logger.info(f"seeded {messages} messages in one room")
+        results = await measure(
+            engine,
+            [depth for depth in depths if depth + limit <= messages],
+            limit,
+            repeat,
+        )
+    for depth, (offset_ms, keyset_ms) in results.items():
+        logger.info(
+            f"page of {limit} at depth {depth}: offset {offset_ms:.2f} ms, "
+            f"before_id {keyset_ms:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="room history page latency by depth, offset vs before_id"
+    )
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument(
+        "--depths",
+        type=int,
+        nargs="+",
+        default=[0, 1_000, 10_000, 100_000, 500_000, 999_000],
+    )
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.depths, args.limit, args.repeat))
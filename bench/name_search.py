@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import raiseload
+
+from account.models import User
+from account.utils import fuzzy_name_match, name_search_filter
+from logger import logger
+from .utils import median_ms, required_url, seed_users, throwaway_postgres
+
+user_id = 1
+
+
+async def seed(sessions: async_sessionmaker, users: int) -> None:
+    """users users and the trigram index of the c4f8a2e6d913 revision."""
+    async with sessions() as db:
+        await db.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await db.commit()
+        await seed_users(db, users)
+        await db.execute(
+            text(
+                "CREATE INDEX ix_users_full_name_trgm ON users "
+                "USING gin ((first_name || ' ' || last_name) gin_trgm_ops)"
+            )
+        )
+        await db.execute(text("ANALYZE users"))
+        await db.commit()
+
+
+async def ilike_search(db: AsyncSession, term: str, limit: int) -> list[User]:
+    """The name search of /account/search."""
+    stmt = (
+        select(User)
+        .options(raiseload("*"))
+        .where(name_search_filter(term))
+        .offset(0)
+        .limit(limit)
+    )
+    return (await db.scalars(stmt)).unique().all()
+
+
+async def trigram_search(db: AsyncSession, term: str, limit: int) -> list[User]:
+    """The first page of /account/search/fuzzy."""
+    score, match = fuzzy_name_match(term)
+    stmt = (
+        select(User, score)
+        .options(raiseload("*"))
+        .where(match, User.id != user_id)
+        .order_by(score.desc(), User.id.asc())
+        .limit(limit)
+    )
+    return [usr for usr, _ in (await db.execute(stmt)).all()]
+
+
+async def measure(
+    sessions: async_sessionmaker, terms: list[str], limit: int, repeat: int
+) -> dict[str, dict[str, tuple[float, int]]]:
+    """Median milliseconds and result count of both searches for every term."""
+    results = {}
+    async with sessions() as db:
+        for term in terms:
+            results[term] = {}
+            for name, search in (("ilike", ilike_search), ("trigram", trigram_search)):
+                found = len(await search(db, term, limit))
+                elapsed = await median_ms(lambda: search(db, term, limit), repeat)
+                results[term][name] = (elapsed, found)
+    return results
+
+
+async def main(users: int, terms: list[str], limit: int, repeat: int) -> None:
+    async with throwaway_postgres(required_url("TEST_DATABASE_URL")) as sessions:
+        await seed(sessions, users)
+        logger.info(f"seeded {users} users with the trigram index")
+        results = await measure(sessions, terms, limit, repeat)
+    for term, searches in results.items():
+        logger.info(
+            f"{term!r}: "
+            + ", ".join(
+                f"{name} {elapsed:.1f} ms for {found} users"
+                for name, (elapsed, found) in searches.items()
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="name search latency, ilike vs trigram similarity"
+    )
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument(
+        "--terms",
+        nargs="+",
+        default=["Sita Shrestha", "Krishna", "Jonathon", "Shresta", "Tamang"],
+    )
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.terms, args.limit, args.repeat))
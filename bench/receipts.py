@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+from bson import ObjectId
+from odmantic import AIOEngine
+
+from database.indexes import sync_indexes
+from logger import logger
+from message.mangomodel import Message, ReadWatermark, utc_now
+from message.utils import change_msg_status
+from .utils import app_mongo, required_url, throwaway_mongo
+
+room_id = "bench-room"
+sender_id = 1
+reader_id = 2
+
+
+async def seed(engine: AIOEngine, batches: int, batch_size: int) -> list[list[str]]:
+    """
+    batches receipt batches of batch_size sent messages, every fifth one sent
+    by the reader. Returns the message ids of every batch.
+    """
+    await sync_indexes(engine, [Message, ReadWatermark])
+    id_batches = []
+    for _ in range(batches):
+        documents = [
+            {
+                "_id": ObjectId(),
+                "room_id": room_id,
+                "sender_id": reader_id if index % 5 == 0 else sender_id,
+                "message_text": f"message {index}",
+                "message_type": "text",
+                "created_at": utc_now(),
+                "status": "sent",
+                "seen_by": [],
+            }
+            for index in range(batch_size)
+        ]
+        await engine.get_collection(Message).insert_many(documents, ordered=False)
+        id_batches.append([str(document["_id"]) for document in documents])
+    return id_batches
+
+
+async def load_and_save(engine: AIOEngine, msg_id_list: list[str], msg_status: str):
+    """The old path, every message is loaded, changed in python and saved back."""
+    messages = await engine.find(
+        Message, Message.id.in_([ObjectId(msg_id) for msg_id in msg_id_list])
+    )
+    for msg in messages:
+        if msg.sender_id != reader_id:
+            msg.status = msg_status
+    await engine.save_all(messages)
+    return messages
+
+
+async def timed_batches(func, id_batches: list[list[str]]) -> tuple[float, int]:
+    """Median milliseconds of func on every batch and the ids it returned last."""
+    samples, returned = [], 0
+    for msg_id_list in id_batches:
+        start = time.perf_counter()
+        returned = len(await func(msg_id_list))
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), returned
+
+
+async def measure(
+    engine: AIOEngine, id_batches: list[list[str]]
+) -> dict[str, tuple[float, int]]:
+    """
+    Delivered receipts of the reader on fresh batches, half through the old
+    path and half through change_msg_status, then a repeated receipt on the
+    batches change_msg_status already moved, which changes nothing.
+    """
+    half = len(id_batches) // 2
+    old_batches, new_batches = id_batches[:half], id_batches[half:]
+    with app_mongo(engine):
+        results = {
+            "load and save": await timed_batches(
+                lambda ids: load_and_save(engine, ids, "delivered"), old_batches
+            ),
+            "filtered update": await timed_batches(
+                lambda ids: change_msg_status(ids, "delivered", reader_id),
+                new_batches,
+            ),
+            "repeated receipt": await timed_batches(
+                lambda ids: change_msg_status(ids, "delivered", reader_id),
+                new_batches,
+            ),
+        }
+    assert results["repeated receipt"][1] == 0
+    return results
+
+
+async def main(batches: int, batch_size: int) -> None:
+    async with throwaway_mongo(required_url("TEST_MANGODB_URL")) as engine:
+        id_batches = await seed(engine, batches, batch_size)
+        logger.info(f"seeded {batches} batches of {batch_size} messages")
+        results = await measure(engine, id_batches)
+    for path, (elapsed, returned) in results.items():
+        logger.info(
+            f"{path}: {elapsed:.1f} ms per receipt of {batch_size} ids, "
+            f"{returned} messages in the last response"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="read receipt batches, load and save vs one filtered update"
+    )
+    parser.add_argument("--batches", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.batches, args.batch_size))
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from logger import logger
+from websocket.manager.registry import Connection, ConnectionRegistry
+
+
+class IdleWebSocket:
+    async def send_text(self, text: str) -> None:
+        pass
+
+
+async def measure(
+    connections: int, devices: int, rooms_per_connection: int, rooms: int
+) -> dict:
+    """
+    Memory of connections and of their registry indexes, the users hold
+    devices connections each and every connection joins rooms_per_connection
+    of rooms rooms. Sizes are in bytes, timings in milliseconds.
+    """
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        cons = [
+            Connection(IdleWebSocket(), index // devices)
+            for index in range(connections)
+        ]
+        connections_size = tracemalloc.get_traced_memory()[0] - start
+
+        registry = ConnectionRegistry()
+        start = tracemalloc.get_traced_memory()[0]
+        for index, con in enumerate(cons):
+            registry.add_user(con)
+            for offset in range(rooms_per_connection):
+                registry.join_room(f"room-{(index + offset) % rooms}", con)
+        index_size = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+    start = time.perf_counter()
+    for con in cons:
+        registry.remove(con)
+        con.outbound.close()
+    remove_ms = (time.perf_counter() - start) * 1000
+    assert not registry.users and not registry.rooms and not registry.connection_rooms
+
+    return {
+        "connection_bytes": connections_size / connections,
+        "index_bytes": index_size / connections,
+        "total_mib": (connections_size + index_size) / 2**20,
+        "remove_us": remove_ms * 1000 / connections,
+    }
+
+
+async def main(
+    connections: int, devices: int, rooms_per_connection: int, rooms: int
+) -> None:
+    result = await measure(connections, devices, rooms_per_connection, rooms)
+    logger.info(
+        f"{connections} connections, {devices} per user, "
+        f"{rooms_per_connection} of {rooms} rooms each: "
+        f"{result['connection_bytes']:.0f} bytes per connection with its queue, "
+        f"{result['index_bytes']:.0f} bytes of registry indexes per connection "
+        f"({result['total_mib']:.1f} MiB in all), "
+        f"{result['remove_us']:.1f} us to remove one"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="memory of the connection registry at many simulated connections"
+    )
+    parser.add_argument("--connections", type=int, default=100_000)
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--rooms-per-connection", type=int, default=5)
+    parser.add_argument("--rooms", type=int, default=10_000)
+    args = parser.parse_args()
+    asyncio.run(
+        main(args.connections, args.devices, args.rooms_per_connection, args.rooms)
+    )
@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import raiseload
+
+from account.models import BlockedUser, Friend, RequestedUser, User
+from account.schemas import FriendSearch
+from account.utils import get_friend_search_res, name_search_filter
+from logger import logger
+from query import UserQuery
+from .utils import (
+    median_ms,
+    required_url,
+    seed_relation,
+    seed_users,
+    throwaway_postgres,
+)
+
+user_id = 1
+
+
+async def seed(
+    sessions: async_sessionmaker,
+    users: int,
+    friends: int,
+    requests: int,
+    blocked: int,
+) -> None:
+    """
+    users users, user_id with friends friends, requests requests in each
+    direction and blocked blocked users among the users right after it.
+    """
+    related = list(range(user_id + 1, user_id + 1 + friends + 2 * requests + blocked))
+    async with sessions() as db:
+        await seed_users(db, max(users, 1 + len(related)))
+        await seed_relation(db, Friend, [user_id] * friends, related[:friends])
+        await seed_relation(
+            db,
+            RequestedUser,
+            [user_id] * requests,
+            related[friends : friends + requests],
+        )
+        await seed_relation(
+            db,
+            RequestedUser,
+            related[friends + requests : friends + 2 * requests],
+            [user_id] * requests,
+        )
+        await seed_relation(
+            db, BlockedUser, [user_id] * blocked, related[friends + 2 * requests :]
+        )
+
+
+async def search(db: AsyncSession, term: str, limit: int) -> list[User]:
+    """The name search of /account/search."""
+    stmt = (
+        select(User)
+        .options(raiseload("*"))
+        .where(name_search_filter(term))
+        .limit(limit)
+    )
+    return (await db.scalars(stmt)).unique().all()
+
+
+def list_search_res(users: list[User], self_user: User) -> list[FriendSearch]:
+    """The old classification, membership tests on the relationship lists."""
+    response = []
+    for usr in users:
+        if usr in self_user.friend or usr in self_user.friend_by:
+            status = "friend"
+        elif usr in self_user.requested_user:
+            status = "requested"
+        elif usr in self_user.requested_by:
+            status = "requested_by"
+        elif usr in self_user.blocked_user:
+            status = "blocked"
+        else:
+            status = "none"
+        response.append(FriendSearch(**usr.__dict__, friend_status=status))
+    return response
+
+
+async def with_relationship_lists(
+    sessions: async_sessionmaker, term: str, limit: int
+) -> list[FriendSearch]:
+    # selectin, joining every relationship multiplies the rows past any limit
+    async with sessions() as db:
+        self_user = await UserQuery.one(db, user_id, UserQuery.all_relations)
+        return list_search_res(await search(db, term, limit), self_user)
+
+
+async def with_relation_index(
+    sessions: async_sessionmaker, term: str, limit: int
+) -> list[FriendSearch]:
+    async with sessions() as db:
+        relations = await UserQuery.relation_index(db, user_id)
+        return get_friend_search_res(await search(db, term, limit), relations)
+
+
+async def measure(
+    sessions: async_sessionmaker, term: str, limit: int, repeat: int
+) -> dict[str, float]:
+    """Median milliseconds of a search of term classified both ways."""
+    old = await with_relationship_lists(sessions, term, limit)
+    new = await with_relation_index(sessions, term, limit)
+    assert sorted((usr.id, usr.friend_status) for usr in old) == sorted(
+        (usr.id, usr.friend_status) for usr in new
+    )
+    return {
+        "relationship lists": await median_ms(
+            lambda: with_relationship_lists(sessions, term, limit), repeat
+        ),
+        "relation index": await median_ms(
+            lambda: with_relation_index(sessions, term, limit), repeat
+        ),
+    }
+
+
+async def main(
+    users: int,
+    friends: int,
+    requests: int,
+    blocked: int,
+    term: str,
+    limit: int,
+    repeat: int,
+) -> None:
+    async with throwaway_postgres(required_url("TEST_DATABASE_URL")) as sessions:
+        await seed(sessions, users, friends, requests, blocked)
+        logger.info(
+            f"seeded {users} users, the searching user has {friends} friends, "
+            f"{requests} requests each way and {blocked} blocked users"
+        )
+        results = await measure(sessions, term, limit, repeat)
+    for name, elapsed in results.items():
+        logger.info(f"search {term!r} limit {limit} with {name}: {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="friend status of search results, relationship lists vs index"
+    )
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--friends", type=int, default=3_000)
+    parser.add_argument("--requests", type=int, default=1_000)
+    parser.add_argument("--blocked", type=int, default=100)
+    parser.add_argument("--term", default="a")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.users,
+            args.friends,
+            args.requests,
+            args.blocked,
+            args.term,
+            args.limit,
+            args.repeat,
+        )
+    )
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import time
+
+from account.schemas import UserModel
+from logger import logger
+from message.mangomodel import Message
+from websocket.manager.registry import Connection
+from websocket.schema import EncodedFrame, WebSocketResponse
+
+
+class CountingWebSocket:
+    def __init__(self) -> None:
+        self.received = 0
+
+    async def send_text(self, text: str) -> None:
+        self.received += 1
+
+
+def sample_response(messages: int = 1) -> WebSocketResponse:
+    sender = UserModel(
+        id=1,
+        uid="bench",
+        username="bench",
+        profile="https://example.com/profile.png",
+        email="bench@example.com",
+        first_name="Bench",
+        last_name="User",
+        contact_number_country_code=977,
+        contact_number=9800000000,
+        address="Kathmandu",
+    )
+    data = [
+        Message(room_id="room", sender_id=1, message_text="hello " * 20)
+        for _ in range(messages)
+    ]
+    return WebSocketResponse(event_type="new_message", data=data, sender_user=sender)
+
+
+async def per_recipient(response: WebSocketResponse, sockets: list) -> None:
+    """The old path, every recipient serializes the response again."""
+    for websocket in sockets:
+        await websocket.send_text(response.model_dump_json())
+
+
+async def encoded_once(response: WebSocketResponse, connections: list) -> None:
+    """The current path, one EncodedFrame is queued on every connection."""
+    frame = EncodedFrame.encode(response)
+    for con in connections:
+        con.send_frame(frame)
+    while any(con.outbound.depth for con in connections):
+        await asyncio.sleep(0)
+
+
+async def compare(recipients: int, broadcasts: int) -> tuple[float, float]:
+    """Milliseconds per broadcast of the old and the current path."""
+    response = sample_response()
+    sockets = [CountingWebSocket() for _ in range(recipients)]
+    connections = [
+        Connection(CountingWebSocket(), user_id) for user_id in range(recipients)
+    ]
+    try:
+        start = time.perf_counter()
+        for _ in range(broadcasts):
+            await per_recipient(response, sockets)
+        old = (time.perf_counter() - start) * 1000 / broadcasts
+
+        start = time.perf_counter()
+        for _ in range(broadcasts):
+            await encoded_once(response, connections)
+        new = (time.perf_counter() - start) * 1000 / broadcasts
+    finally:
+        for con in connections:
+            con.outbound.close()
+    assert all(websocket.received == broadcasts for websocket in sockets)
+    assert all(con.websocket.received == broadcasts for con in connections)
+    return old, new
+
+
+async def main(sizes: list[int], broadcasts: int) -> None:
+    for recipients in sizes:
+        old, new = await compare(recipients, broadcasts)
+        logger.info(
+            f"{recipients} recipients: per recipient {old:.3f} ms, "
+            f"encoded once {new:.3f} ms, {old / new:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="broadcast serialization, per recipient vs encoded once"
+    )
+    parser.add_argument("--recipients", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--broadcasts", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.recipients, args.broadcasts))
@@ -0,0 +1,154 @@
+import contextlib
+import os
+import statistics
+import sys
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterator
+from uuid import uuid4
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from odmantic import AIOEngine
+from sqlalchemy import ARRAY, Text, bindparam, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from account.models import User
+from database.base import Base
+from database.mangodb import mango_sessionmanager
+from logger import logger
+
+# seeded names are every first name with every prefix and suffix of a last name
+first_names = (
+    "Aarav Aayush Anil Anita Arjun Asha Bikash Bina Deepak Dipika Ganesh "
+    "Gita Hari Indira Jonathan Kabita Kamal Krishna Laxmi Manish Maya Nabin "
+    "Nisha Prakash Pooja Rajesh Rita Roshan Sabina Sagar Sanjay Sarita "
+    "Shyam Sita Sunil Sushma Suraj Tara Umesh Yamuna"
+).split()
+last_name_prefixes = (
+    "Adhi Bhan Bhat Chau Dah Gaut Ghim Gur Kar Khad Lam Mag Mah Neup Pan "
+    "Paud Pok Rai Reg Sap Shar Shre Sub Tam Thap Tim Up Wag Yad Smi"
+).split()
+last_name_suffixes = (
+    "ari dari ha hal kari lal ma mi na ni ra rel sal stha th tri ung wal ya za"
+).split()
+
+
+def required_url(name: str) -> str:
+    """Url of the database a benchmark seeds, exits when it is not set."""
+    url = os.environ.get(name)
+    if not url:
+        logger.error(f"set {name} to a database the benchmark may fill")
+        sys.exit(1)
+    return url
+
+
+@contextlib.asynccontextmanager
+async def throwaway_mongo(url: str) -> AsyncIterator[AIOEngine]:
+    """Engine on a database of its own, dropped on exit."""
+    client = AsyncIOMotorClient(url)
+    database = f"bench_{uuid4().hex}"
+    try:
+        yield AIOEngine(client=client, database=database)
+    finally:
+        await client.drop_database(database)
+        client.close()
+
+
+async def median_ms(func: Callable[[], Awaitable], repeat: int) -> float:
+    """Median milliseconds of repeat calls, after one untimed warm up call."""
+    await func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+@contextlib.asynccontextmanager
+async def throwaway_postgres(url: str) -> AsyncIterator[async_sessionmaker]:
+    """
+    Sessions on a schema of their own holding every table, dropped on exit.
+    Extensions stay in public, which is on the search path too.
+    """
+    schema = f"bench_{uuid4().hex}"
+    admin = create_async_engine(url)
+    async with admin.begin() as connection:
+        await connection.execute(text(f'CREATE SCHEMA "{schema}"'))
+    engine = create_async_engine(
+        url, connect_args={"server_settings": {"search_path": f"{schema}, public"}}
+    )
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        yield async_sessionmaker(engine, expire_on_commit=False)
+    finally:
+        await engine.dispose()
+        async with admin.begin() as connection:
+            await connection.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+        await admin.dispose()
+
+
+async def seed_users(db: AsyncSession, users: int, first_id: int = 1) -> None:
+    """
+    users users from first_id on, in one statement. User i has contact number
+    9800000000 + i and a name from the seeded name lists.
+    """
+    await db.execute(
+        text(
+            f"INSERT INTO {User.__tablename__} "
+            "(id, uid, first_name, last_name, email, username, hashed_password, "
+            "contact_number) "
+            "SELECT i, 'uid' || i, "
+            "(:first_names)[1 + i % :first_count], "
+            "(:prefixes)[1 + (i / :first_count) % :prefix_count] "
+            "|| (:suffixes)"
+            "[1 + (i / :first_count / :prefix_count) % :suffix_count], "
+            "'user' || i || '@example.com', 'user' || i, '', 9800000000 + i "
+            "FROM generate_series(:first_id, :last_id) AS i"
+        ).bindparams(
+            bindparam("first_names", type_=ARRAY(Text)),
+            bindparam("prefixes", type_=ARRAY(Text)),
+            bindparam("suffixes", type_=ARRAY(Text)),
+        ),
+        {
+            "first_names": first_names,
+            "prefixes": last_name_prefixes,
+            "suffixes": last_name_suffixes,
+            "first_count": len(first_names),
+            "prefix_count": len(last_name_prefixes),
+            "suffix_count": len(last_name_suffixes),
+            "first_id": first_id,
+            "last_id": first_id + users - 1,
+        },
+    )
+    await db.commit()
+
+
+async def seed_relation(
+    db: AsyncSession, model, user_ids: list[int], related_ids: list[int]
+) -> None:
+    """A model row for every pair of user_ids and related_ids, in order."""
+    if not user_ids:
+        return
+    user_column, related_column = (
+        column.name for column in model.__table__.columns if column.foreign_keys
+    )
+    await db.execute(
+        insert(model),
+        [
+            {user_column: user_id, related_column: related_id}
+            for user_id, related_id in zip(user_ids, related_ids)
+        ],
+    )
+    await db.commit()
+
+
+@contextlib.contextmanager
+def app_mongo(engine: AIOEngine) -> Iterator[None]:
+    """Point the engine of the app at engine, for code that uses the global one."""
+    previous = mango_sessionmanager.engine
+    mango_sessionmanager.engine = engine
+    try:
+        yield
+    finally:
+        mango_sessionmanager.engine = previous
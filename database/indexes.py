@@ -0,0 +1,81 @@
+from typing import Sequence, Type
+
+import pymongo
+from odmantic import AIOEngine, Model
+from odmantic.index import ODMBaseIndex
+
+from auth.mangomodel import OutstandingRefreshToken, BlackListedRefreshToken
+from logger import logger
+from message.mangomodel import ChatRoom, Message, RoomSummary, ReadWatermark
+
+mongo_models: list[Type[Model]] = [
+    Message,
+    ChatRoom,
+    RoomSummary,
+    ReadWatermark,
+    OutstandingRefreshToken,
+    BlackListedRefreshToken,
+]
+
+
+def declared_indexes(model: Type[Model]) -> dict[str, pymongo.IndexModel]:
+    indexes = [
+        index.get_pymongo_index() if isinstance(index, ODMBaseIndex) else index
+        for index in model.__indexes__()
+    ]
+    return {index.document["name"]: index for index in indexes}
+
+
+def index_spec(index: dict) -> tuple:
+    return (
+        list(index["key"].items()),
+        index.get("unique", False),
+        index.get("expireAfterSeconds"),
+    )
+
+
+async def sync_indexes(
+    engine: AIOEngine, models: Sequence[Type[Model]] = mongo_models
+) -> dict[str, dict[str, list[str]]]:
+    """
+    Create the declared indexes that are missing and report drift: indexes in
+    the database that are not declared or that differ from their declaration.
+    Existing indexes are never dropped.
+    """
+    report = {}
+    for model in models:
+        collection = engine.get_collection(model)
+        declared = declared_indexes(model)
+        existing = await collection.index_information()
+        existing = {
+            name: {**info, "key": dict(info["key"])} for name, info in existing.items()
+        }
+
+        missing = [name for name in declared if name not in existing]
+        if missing:
+            await collection.create_indexes([declared[name] for name in missing])
+
+        changed = [
+            name
+            for name in declared
+            if name in existing
+            and index_spec(existing[name]) != index_spec(declared[name].document)
+        ]
+        undeclared = [
+            name for name in existing if name != "_id_" and name not in declared
+        ]
+
+        report[model.__collection__] = {
+            "created": missing,
+            "changed": changed,
+            "undeclared": undeclared,
+        }
+        if missing:
+            logger.info(f"{model.__collection__}: created indexes {missing}")
+        if changed or undeclared:
+            logger.warning(
+                f"{model.__collection__}: index drift, changed {changed}, "
+                f"undeclared {undeclared}"
+            )
+
+    return report
@@ -10,10 +10,18 @@ import auth.routes as authroutes
 import websocket.routes as wsroutes
 from account.schemas import UserResponse
 from query import UserQuery
+from auth.hashing import password_hasher
+from auth.utils import sweep_expired_tokens
 from auth.middleware import BearerTokenAuthBackend, AuthenticationMiddleware
 from auth.permission import require_authentication
 from database.asyncdb import asyncdb_dependency, sessionmanager
+from database.indexes import sync_indexes
 from database.mangodb import mango_sessionmanager
+from message.writer import message_writer
+from websocket.manager.connections import deliver
+from websocket.manager.fanout import fanout
+from websocket.manager.presence import presence
+from websocket.manager.receipts import receipt_coalescer
 import account.routes as accountRoutes
 import message.routes as messageRoutes
 import notification.routes as notificationRoutes
@@ -23,10 +31,20 @@ import json
 @asynccontextmanager
 async def lifespan(application: FastAPI):
     # on startup code
+    await sync_indexes(mango_sessionmanager.engine)
+    await sweep_expired_tokens(mango_sessionmanager.engine)
+    await fanout.start(deliver)
+    await presence.start()
 
     yield
 
     # on shutdown code
+    await receipt_coalescer.close()
+    await presence.close()
+    await fanout.close()
+    await message_writer.close()
+    password_hasher.close()
+
     if sessionmanager.get_engine() is not None:
         # Close the DB connection
         await sessionmanager.close()
@@ -115,8 +133,8 @@ async def get_user(
     user_id: int | None = None,
 ):
     if user_id:
-        return await UserQuery.one(db, user_id)
+        return await UserQuery.one(db, user_id, UserQuery.all_relations)
     elif uid:
-        return await UserQuery.one_by_uid(db, uid)
+        return await UserQuery.one_by_uid(db, uid, UserQuery.all_relations)
 
-    return await UserQuery.one(db, request.user.id)
+    return await UserQuery.one(db, request.user.id, UserQuery.all_relations)
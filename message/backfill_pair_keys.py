@@ -0,0 +1,65 @@
+"""
+Set the pair_key of friend rooms created before it existed.
+
+Rooms are walked in _id order in batches so the backfill can be stopped and
+run again. When two rooms exist for the same pair the older one keeps the key
+and the others are reported:
+    python -m message.backfill_pair_keys --batch-size 1000
+"""
+
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database.mangodb import mango_sessionmanager
+from logger import logger
+from message.mangomodel import ChatRoom, friend_pair_key
+
+
+async def backfill(batch_size: int) -> int:
+    collection = mango_sessionmanager.engine.get_collection(ChatRoom)
+    query = {"type": "friend", "pair_key": None}
+    keyed = 0
+    while True:
+        batch = await collection.find(
+            query, {"users.user_id": 1}, sort=[("_id", 1)]
+        ).to_list(length=batch_size)
+        if not batch:
+            return keyed
+
+        operations = [
+            UpdateOne(
+                {"_id": room["_id"], "pair_key": None},
+                {"$set": {"pair_key": friend_pair_key(*users)}},
+            )
+            for room in batch
+            if len(users := [usr["user_id"] for usr in room["users"]]) == 2
+        ]
+        try:
+            if operations:
+                result = await collection.bulk_write(operations, ordered=False)
+                keyed += result.modified_count
+        except BulkWriteError as exc:
+            keyed += exc.details.get("nModified", 0)
+            for error in exc.details.get("writeErrors", []):
+                logger.warning(
+                    f"duplicate friend room {error['op']['q']['_id']}: "
+                    f"{error['errmsg']}"
+                )
+
+        # continue after the batch, duplicates and odd rooms stay without a key
+        query = {"type": "friend", "pair_key": None, "_id": {"$gt": batch[-1]["_id"]}}
+        logger.info(f"chat_room.pair_key: {keyed} rooms keyed")
+
+
+async def main(batch_size: int) -> None:
+    await backfill(batch_size)
+    mango_sessionmanager.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="backfill friend room pair keys")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args().batch_size))
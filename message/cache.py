@@ -0,0 +1,107 @@
+import time
+from collections import OrderedDict
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from database.mangodb import mango_sessionmanager
+from message.mangomodel import ChatRoom
+from settings import MESSAGE
+
+
+class CachedRoom:
+    __slots__ = ("id", "type", "is_active", "users", "expires_at")
+
+    def __init__(
+        self, id: str, type: str, is_active: bool, users: frozenset[int]
+    ) -> None:
+        self.id = id
+        self.type = type
+        self.is_active = is_active
+        self.users = users
+        self.expires_at = 0.0
+
+
+class Fetch:
+    """Fetches of one room in flight and the invalidations seen meanwhile."""
+
+    __slots__ = ("count", "generation")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.generation = 0
+
+
+class RoomCache:
+    """
+    In-process LRU cache of chat room type, status and members. Entries live
+    for ttl seconds at most and the least recently used entry is evicted past
+    max_size. Anything that changes a room must call invalidate, a fetch that
+    overlapped an invalidation returns its room without caching it.
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.rooms: OrderedDict[str, CachedRoom] = OrderedDict()
+        self.fetches: dict[str, Fetch] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, room_id: str) -> CachedRoom | None:
+        room = self.rooms.get(room_id)
+        if room is not None and room.expires_at > time.monotonic():
+            self.rooms.move_to_end(room_id)
+            self.hits += 1
+            return room
+
+        self.misses += 1
+        try:
+            room_object_id = ObjectId(room_id)
+        except (InvalidId, TypeError):
+            return None
+        fetch = self.fetches.setdefault(room_id, Fetch())
+        fetch.count += 1
+        generation = fetch.generation
+        try:
+            doc = await mango_sessionmanager.engine.get_collection(ChatRoom).find_one(
+                {"_id": room_object_id},
+                {"type": 1, "is_active": 1, "users.user_id": 1},
+            )
+        finally:
+            fetch.count -= 1
+            if not fetch.count:
+                del self.fetches[room_id]
+
+        if doc is None:
+            self.rooms.pop(room_id, None)
+            return None
+        room = CachedRoom(
+            room_id,
+            doc["type"],
+            doc["is_active"],
+            frozenset(usr["user_id"] for usr in doc["users"]),
+        )
+        if fetch.generation != generation:
+            return room
+        return self.put(room)
+
+    def put(self, room: CachedRoom) -> CachedRoom:
+        room.expires_at = time.monotonic() + self.ttl
+        self.rooms[room.id] = room
+        self.rooms.move_to_end(room.id)
+        while len(self.rooms) > self.max_size:
+            self.rooms.popitem(last=False)
+        return room
+
+    def invalidate(self, room_id: str) -> None:
+        self.rooms.pop(room_id, None)
+        fetch = self.fetches.get(room_id)
+        if fetch is not None:
+            fetch.generation += 1
+
+    def stats(self) -> dict:
+        return {"size": len(self.rooms), "hits": self.hits, "misses": self.misses}
+
+
+room_cache = RoomCache(MESSAGE["ROOM_CACHE_TTL"], MESSAGE["ROOM_CACHE_SIZE"])
@@ -1,6 +1,8 @@
-from datetime import datetime
-from odmantic import Field, Model
-from pydantic import field_validator
+from datetime import datetime, timezone
+from bson import ObjectId
+import pymongo
+from odmantic import Field, Model, Index
+from pydantic import field_validator, field_serializer
 from typing import Optional
 import pytz
 
@@ -9,11 +11,39 @@ valid_chatroom_type = ["group", "friend"]
 valid_message_status = ["sent", "delivered", "seen"]
 
 datetime_format = "%b %d %Y %I:%M:%S %p"
+kathmandu_tz = pytz.timezone("Asia/Kathmandu")
 
 
-def formated_date():
-    kathmandu_tz = pytz.timezone("Asia/Kathmandu")
-    return datetime.now(kathmandu_tz).strftime(datetime_format)
+def utc_now() -> datetime:
+    # mongo stores naive datetimes as utc
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def formated_date(value: datetime) -> str:
+    """Legacy api format of a utc datetime, in kathmandu time."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(kathmandu_tz).strftime(datetime_format)
+
+
+def parse_formated_date(value: str) -> datetime:
+    """Naive utc datetime of a legacy formatted string."""
+    local = kathmandu_tz.localize(datetime.strptime(value, datetime_format))
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def friend_pair_key(first_user_id: int, second_user_id: int) -> str:
+    """Same key for both orders of the two users of a friend room."""
+    return ":".join(str(user_id) for user_id in sorted((first_user_id, second_user_id)))
+
+
+def validate_legacy_date(value):
+    if isinstance(value, str):
+        try:
+            return parse_formated_date(value)
+        except ValueError:
+            return value
+    return value
 
 
 class Message(Model):
@@ -21,11 +51,24 @@ class Message(Model):
     sender_id: int
     message_text: Optional[str] = None
     message_type: str = Field(default="text")
-    created_at: str = Field(default_factory=formated_date)
+    created_at: datetime = Field(default_factory=utc_now)
     file_links: Optional[list[str]] = None
     status: str = Field(default="sent")
     seen_by: list[int] = Field(default=[])
 
+    model_config = {
+        # room history pages and lookups walk (room_id, _id) in both directions
+        "indexes": lambda: [Index(Message.room_id, Message.id, name="room_id_id")],
+    }
+
+    _validate_created_at = field_validator("created_at", mode="before")(
+        validate_legacy_date
+    )
+
+    @field_serializer("created_at", when_used="json")
+    def serialize_created_at(self, v: datetime) -> str:
+        return formated_date(v)
+
     @field_validator("message_type")
     @classmethod
     def validate_message_type(cls, v: str):
@@ -44,16 +87,48 @@ class Message(Model):
 class RoomUser(Model):
     user_id: int
     added_by: Optional[int] = None
-    joined_at: str = Field(default_factory=formated_date)
+    joined_at: datetime = Field(default_factory=utc_now)
     isAdmin: bool
 
+    _validate_joined_at = field_validator("joined_at", mode="before")(
+        validate_legacy_date
+    )
+
+    @field_serializer("joined_at", when_used="json")
+    def serialize_joined_at(self, v: datetime) -> str:
+        return formated_date(v)
+
 
 class ChatRoom(Model):
     users: list[RoomUser]
-    created_at: str = Field(default_factory=formated_date)
+    created_at: datetime = Field(default_factory=utc_now)
     type: str
     created_by: Optional[int] = None
     is_active: bool
+    # sorted user ids of a friend room, see friend_pair_key
+    pair_key: Optional[str] = None
+
+    model_config = {
+        "indexes": lambda: [
+            pymongo.IndexModel(
+                [("users.user_id", pymongo.ASCENDING)], name="users_user_id"
+            ),
+            pymongo.IndexModel(
+                [("pair_key", pymongo.ASCENDING)],
+                name="pair_key",
+                unique=True,
+                partialFilterExpression={"pair_key": {"$type": "string"}},
+            ),
+        ],
+    }
+
+    _validate_created_at = field_validator("created_at", mode="before")(
+        validate_legacy_date
+    )
+
+    @field_serializer("created_at", when_used="json")
+    def serialize_created_at(self, v: datetime) -> str:
+        return formated_date(v)
 
     @field_validator("type")
     @classmethod
@@ -61,3 +136,40 @@ class ChatRoom(Model):
         if v not in valid_chatroom_type:
             raise ValueError(f"chat room type must be one of {valid_chatroom_type}")
         return v
+
+
+class RoomSummary(Model):
+    room_id: str = Field(unique=True)
+    last_message_id: Optional[ObjectId] = None
+    preview: Optional[str] = None
+    last_message_at: Optional[datetime] = None
+    # unread message count keyed by member user id
+    unread: dict[str, int] = Field(default={})
+
+    _validate_last_message_at = field_validator("last_message_at", mode="before")(
+        validate_legacy_date
+    )
+
+    @field_serializer("last_message_at", when_used="json")
+    def serialize_last_message_at(self, v: datetime | None) -> str | None:
+        return formated_date(v) if v else None
+
+
+class ReadWatermark(Model):
+    """Last message a member has read in a room, every older message is seen."""
+
+    room_id: str
+    user_id: int
+    last_read_id: ObjectId
+    updated_at: datetime = Field(default_factory=utc_now)
+
+    model_config = {
+        "indexes": lambda: [
+            Index(
+                ReadWatermark.room_id,
+                ReadWatermark.user_id,
+                unique=True,
+                name="room_id_user_id",
+            )
+        ],
+    }
@@ -0,0 +1,88 @@
+"""
+Convert the legacy "%b %d %Y %I:%M:%S %p" kathmandu time strings stored in
+mongo to native utc datetimes.
+
+Documents are converted in batches and only documents that still hold a
+string are selected, so the migration can be stopped and run again:
+    python -m message.migrate_dates --batch-size 1000
+"""
+
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from database.mangodb import mango_sessionmanager
+from logger import logger
+from message.mangomodel import (
+    ChatRoom,
+    Message,
+    RoomSummary,
+    parse_formated_date,
+)
+
+legacy_fields = (
+    (Message, "created_at"),
+    (ChatRoom, "created_at"),
+    (RoomSummary, "last_message_at"),
+)
+
+
+async def migrate_field(model, field: str, batch_size: int) -> int:
+    collection = mango_sessionmanager.engine.get_collection(model)
+    migrated = 0
+    while True:
+        batch = await collection.find(
+            {field: {"$type": "string"}}, {field: 1}, sort=[("_id", 1)]
+        ).to_list(length=batch_size)
+        if not batch:
+            return migrated
+
+        await collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": doc["_id"]},
+                    {"$set": {field: parse_formated_date(doc[field])}},
+                )
+                for doc in batch
+            ],
+            ordered=False,
+        )
+        migrated += len(batch)
+        logger.info(f"{model.__collection__}.{field}: {migrated} migrated")
+
+
+async def migrate_room_users(batch_size: int) -> int:
+    collection = mango_sessionmanager.engine.get_collection(ChatRoom)
+    migrated = 0
+    while True:
+        batch = await collection.find(
+            {"users.joined_at": {"$type": "string"}}, {"users": 1}, sort=[("_id", 1)]
+        ).to_list(length=batch_size)
+        if not batch:
+            return migrated
+
+        operations = []
+        for doc in batch:
+            for usr in doc["users"]:
+                if isinstance(usr["joined_at"], str):
+                    usr["joined_at"] = parse_formated_date(usr["joined_at"])
+            operations.append(
+                UpdateOne({"_id": doc["_id"]}, {"$set": {"users": doc["users"]}})
+            )
+        await collection.bulk_write(operations, ordered=False)
+        migrated += len(batch)
+        logger.info(f"chat_room.users.joined_at: {migrated} migrated")
+
+
+async def main(batch_size: int) -> None:
+    for model, field in legacy_fields:
+        await migrate_field(model, field, batch_size)
+    await migrate_room_users(batch_size)
+    mango_sessionmanager.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="migrate legacy date strings")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args().batch_size))
@@ -1,18 +1,22 @@
-from fastapi import APIRouter, Request, HTTPException
-from websocket.manager.connections import main_connections, room_connections
+from typing import Annotated
+
+from fastapi import APIRouter, Request, HTTPException, Query
+from websocket.manager.presence import presence
 from database.asyncdb import asyncdb_dependency
-from query import UserQuery
 from auth.permission import require_authentication
 from database.mangodb import mangodb_dependency
-from .mangomodel import ChatRoom, Message
+from .mangomodel import ChatRoom, Message, RoomSummary
 from sqlalchemy import select
+from sqlalchemy.orm import raiseload
 from account.models import User
-from .schema import ChatHistoryResponse, OnlineUserResponse
+from .schema import ChatHistoryResponse, OnlineUserResponse, MessagePage
+from .utils import apply_read_state, history_pipeline
+from .cache import room_cache
+from websocket.manager.fanout import publish_room_changed
 from account.schemas import UserModel
+from settings import MESSAGE
 from bson import ObjectId
 from bson.errors import InvalidId
-from .mangomodel import datetime_format
-from datetime import datetime
 
 
 router = APIRouter(prefix="/message", tags=["message"])
@@ -31,17 +35,47 @@ async def get_rooms(request: Request, mangodb: mangodb_dependency):
 async def get_online_user(
     request: Request, db: asyncdb_dependency, mangodb: mangodb_dependency
 ):
-    user = await UserQuery.one(db, request.user.id, True)
-    online_users = []
-    for friend in (*user.friend, *user.friend_by):
-        if friend.id in main_connections.keys():
-            online_users.append(friend)
+    friend_rooms = await presence.online_friends(request.user.id)
+    if not friend_rooms:
+        return []
+    online_users = (
+        (
+            await db.scalars(
+                select(User)
+                .filter(User.id.in_(list(friend_rooms)))
+                .options(raiseload("*"))
+            )
+        )
+        .unique()
+        .all()
+    )
+    rooms = {
+        str(room.id): room
+        for room in await mangodb.find(
+            ChatRoom,
+            ChatRoom.id.in_([ObjectId(room_id) for room_id in friend_rooms.values()]),
+        )
+    }
+
+    summaries = {
+        summary.room_id: summary
+        for summary in await mangodb.find(
+            RoomSummary,
+            RoomSummary.room_id.in_(list(rooms)),
+        )
+    }
     response = []
     for user in online_users:
-        room_users = [user.id, request.user.id]
-        query = {"users.user_id": {"$all": room_users}}
-        room = await mangodb.find_one(ChatRoom, query)
-        response.append(OnlineUserResponse(user=UserModel(**user.__dict__), room=room))
+        room = rooms.get(friend_rooms[user.id])
+        if room is None:
+            continue
+        response.append(
+            OnlineUserResponse(
+                user=UserModel(**user.__dict__),
+                room=room,
+                summary=summaries.get(str(room.id)),
+            )
+        )
 
     return response
 
@@ -51,60 +85,44 @@ async def get_online_user(
 async def get_chat_history(
     request: Request, db: asyncdb_dependency, mangodb: mangodb_dependency
 ):
-    rooms = await mangodb.find(ChatRoom, {"users.user_id": request.user.id})
-    history_user_id = []
-    history_user_room = []
-    for room in rooms:
-        room_data = {"room": room, "users": []}
-        for usr in room.users:
-            if usr.user_id != request.user.id:
-                history_user_id.append(usr.user_id)
-                room_data["users"].append(usr.user_id)
-        history_user_room.append(room_data)
+    collection = mangodb.engine.get_collection(ChatRoom)
+    rooms = await collection.aggregate(history_pipeline(request.user.id)).to_list(
+        length=None
+    )
 
+    history_user_id = {
+        usr["user_id"]
+        for room in rooms
+        for usr in room["users"]
+        if usr["user_id"] != request.user.id
+    }
     history_user_query = select(User).filter(User.id.in_(history_user_id))
-    history_user = (await db.scalars(history_user_query)).unique().all()
+    history_user = {
+        usr.id: usr for usr in (await db.scalars(history_user_query)).unique().all()
+    }
 
     results = []
-
-    for room in history_user_room:
-        messages = await mangodb.find(
-            Message,
-            Message.room_id == str(room["room"].id),
-            limit=5,
-            sort=Message.id.desc(),
-        )
-        unseen_msg_quantity = 0
-        for msg in messages:
-            if msg.status != "seen" and msg.sender_id != request.user.id:
-                unseen_msg_quantity += 1
-
-        msg = messages[0] if messages else None
-
-        result = ChatHistoryResponse(
-            room=room["room"],
-            users=[],
-            message=msg,
-            quantity=unseen_msg_quantity,
+    for room in rooms:
+        msg = room.pop("message", None)
+        quantity = room.pop("quantity")
+        read_by = room.pop("read_by")
+        if msg and read_by:
+            msg["status"] = "seen"
+        chat_room = ChatRoom.model_validate_doc(room)
+        results.append(
+            ChatHistoryResponse(
+                room=chat_room,
+                users=[
+                    UserModel(**history_user[usr.user_id].__dict__)
+                    for usr in chat_room.users
+                    if usr.user_id != request.user.id and usr.user_id in history_user
+                ],
+                message=Message.model_validate_doc(msg) if msg else None,
+                quantity=quantity,
+            )
         )
-        for room_usr in room["users"]:
-            for usr in history_user:
-                if usr.id == room_usr:
-                    result.users.append(UserModel(**usr.__dict__))
-                    break
-        results.append(result)
-
-    sorted_results = sorted(
-        results,
-        key=lambda chat_object: (
-            datetime.strptime(chat_object.message.created_at, datetime_format)
-            if chat_object.message is not None
-            else datetime.strptime(chat_object.room.created_at, datetime_format)
-        ),
-        reverse=True,
-    )
 
-    return sorted_results
+    return results
 
 
 @router.get("/initialRoom")
@@ -133,28 +151,64 @@ async def get_rooms(request: Request, mangodb: mangodb_dependency, room_id: str)
 @router.get("/msg/{room_id}")
 @require_authentication()
 async def get_room_messages(
-    request: Request, mangodb: mangodb_dependency, room_id: str, offset: int, limit: int
+    request: Request,
+    mangodb: mangodb_dependency,
+    room_id: str,
+    limit: Annotated[int, Query(gt=0, le=MESSAGE["PAGE_SIZE_LIMIT"])],
+    offset: Annotated[int | None, Query(ge=0)] = None,
+    before_id: str | None = None,
+    after_id: str | None = None,
 ):
-    try:
-        room = await mangodb.find_one(ChatRoom, ChatRoom.id == ObjectId(room_id))
-        if not room:
-            raise InvalidId
+    """
+    Without offset the page is keyed on the message id: before_id walks back
+    through history, after_id walks forward and next_cursor continues the same
+    direction. Passing offset keeps the old skip based list response.
+    """
+    room = await room_cache.get(room_id)
+    if not room:
+        raise HTTPException(detail="invalid room id", status_code=403)
+
+    if request.user.id not in room.users:
+        raise HTTPException(detail="user not in room", status_code=403)
+
+    if offset is not None and before_id is None and after_id is None:
+        messages = await mangodb.find(
+            Message,
+            Message.room_id == room_id,
+            limit=limit,
+            skip=offset,
+            sort=Message.id.desc(),
+        )
+        messages.reverse()
+        return await apply_read_state(room_id, messages)
 
-        if request.user.id not in [usr.user_id for usr in room.users]:
-            raise HTTPException(detail="user not in room", status_code=403)
+    if before_id and after_id:
+        raise HTTPException(detail="use either before_id or after_id", status_code=400)
 
+    try:
+        query = Message.room_id == room_id
+        if after_id:
+            query &= Message.id > ObjectId(after_id)
+        elif before_id:
+            query &= Message.id < ObjectId(before_id)
     except InvalidId:
-        raise HTTPException(detail="invalid room id", status_code=403)
+        raise HTTPException(detail="invalid cursor", status_code=400)
 
     messages = await mangodb.find(
         Message,
-        Message.room_id == room_id,
+        query,
         limit=limit,
-        skip=offset,
-        sort=Message.id.desc(),
+        sort=Message.id.asc() if after_id else Message.id.desc(),
     )
-    messages.reverse()
-    return messages
+    if not after_id:
+        messages.reverse()
+
+    next_cursor = None
+    if len(messages) == limit:
+        next_cursor = str(messages[-1].id if after_id else messages[0].id)
+
+    await apply_read_state(room_id, messages)
+    return MessagePage(messages=messages, next_cursor=next_cursor)
 
 
 @router.get("/friend/{room_id}")
@@ -162,17 +216,13 @@ async def get_room_messages(
 async def get_room_friend(
     request: Request, mangodb: mangodb_dependency, db: asyncdb_dependency, room_id: str
 ):
-    try:
-        room_object_id = ObjectId(room_id)
-    except InvalidId:
+    room = await room_cache.get(room_id)
+    if not room:
         raise HTTPException(detail="invalid room id", status_code=403)
 
-    room = await mangodb.find_one(ChatRoom, ChatRoom.id == room_object_id)
-    if request.user.id not in [usr.user_id for usr in room.users]:
+    if request.user.id not in room.users:
         raise HTTPException(detail="user not in room", status_code=403)
-    friend_user_id = [
-        usr.user_id for usr in room.users if usr.user_id != request.user.id
-    ]
+    friend_user_id = [user_id for user_id in room.users if user_id != request.user.id]
 
     friend_users_query = select(User).filter(User.id.in_(friend_user_id))
     friend_users = (await db.scalars(friend_users_query)).unique().all()
@@ -181,8 +231,10 @@ async def get_room_friend(
             return friend_users[0]
         else:
             if room.is_active:
-                room.is_active = False
-                await mangodb.save(room)
+                await mangodb.engine.get_collection(ChatRoom).update_one(
+                    {"_id": ObjectId(room_id)}, {"$set": {"is_active": False}}
+                )
+                await publish_room_changed(room_id)
             raise HTTPException(detail="friend not found", status_code=404)
 
     return friend_users
@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from .mangomodel import ChatRoom
 from account.schemas import UserModel
-from .mangomodel import Message
+from .mangomodel import Message, RoomSummary
 
 
 class ChatHistoryResponse(BaseModel):
@@ -14,3 +14,22 @@ class ChatHistoryResponse(BaseModel):
 class OnlineUserResponse(BaseModel):
     user: UserModel
     room: ChatRoom
+    summary: RoomSummary | None = None
+
+
+class MessagePage(BaseModel):
+    messages: list[Message]
+    next_cursor: str | None = None
+
+
+class MessageStatusChange(BaseModel):
+    id: str
+    room_id: str
+    sender_id: int
+    status: str
+
+
+class ReadReceipt(BaseModel):
+    room_id: str
+    user_id: int
+    last_read_id: str
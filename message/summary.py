@@ -0,0 +1,217 @@
+"""
+Per room summary kept next to the messages: last message id, preview text,
+timestamp and an unread counter for every member.
+
+Rebuild or check the summaries from the message collection with:
+    python -m message.summary rebuild
+    python -m message.summary check
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+
+from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne
+
+from database.mangodb import mango_sessionmanager
+from logger import logger
+from message.mangomodel import ChatRoom, Message, RoomSummary, ReadWatermark
+
+preview_length = 100
+
+
+def summary_collection():
+    return mango_sessionmanager.engine.get_collection(RoomSummary)
+
+
+async def get_room_members(room_ids: list[str]) -> dict[str, list[int]]:
+    collection = mango_sessionmanager.engine.get_collection(ChatRoom)
+    cursor = collection.find(
+        {"_id": {"$in": [ObjectId(room_id) for room_id in room_ids]}},
+        {"users.user_id": 1},
+    )
+    return {
+        str(room["_id"]): [usr["user_id"] for usr in room["users"]]
+        async for room in cursor
+    }
+
+
+async def record_new_messages(messages: list[Message]) -> None:
+    """Move the last message forward and bump unread counters of the members."""
+    rooms: dict[str, list[Message]] = {}
+    for message in messages:
+        rooms.setdefault(message.room_id, []).append(message)
+
+    members = await get_room_members(list(rooms))
+    operations = []
+    for room_id, room_messages in rooms.items():
+        senders = Counter(message.sender_id for message in room_messages)
+        unread = {
+            f"unread.{user_id}": len(room_messages) - senders[user_id]
+            for user_id in members.get(room_id, [])
+            if len(room_messages) - senders[user_id] > 0
+        }
+        operations.append(
+            UpdateOne({"room_id": room_id}, {"$inc": unread}, upsert=True)
+            if unread
+            else UpdateOne(
+                {"room_id": room_id}, {"$setOnInsert": {"unread": {}}}, upsert=True
+            )
+        )
+
+        # only move forward, batches of other workers may land out of order
+        last = max(room_messages, key=lambda msg: msg.id)
+        operations.append(
+            UpdateOne(
+                {
+                    "room_id": room_id,
+                    "$or": [
+                        {"last_message_id": None},
+                        {"last_message_id": {"$lt": last.id}},
+                    ],
+                },
+                {"$set": summary_last_message(last)},
+            )
+        )
+
+    if operations:
+        await summary_collection().bulk_write(operations, ordered=True)
+
+
+async def record_read_watermark(
+    room_id: str,
+    user_id: int,
+    previous_read_id: ObjectId | None,
+    last_read_id: ObjectId,
+) -> None:
+    """
+    Lower the unread counter of user_id by the messages between the previous
+    and the new watermark. An $inc commutes with the increments of
+    record_new_messages, so a message stored meanwhile is neither lost nor
+    counted twice; the counter may dip below zero until its increment lands.
+    """
+    read = await count_unread(room_id, user_id, previous_read_id, last_read_id)
+    if read:
+        await summary_collection().update_one(
+            {"room_id": room_id}, {"$inc": {f"unread.{user_id}": -read}}
+        )
+
+
+async def count_unread(
+    room_id: str,
+    user_id: int,
+    last_read_id: ObjectId | None,
+    until_id: ObjectId | None = None,
+) -> int:
+    """Messages of others after last_read_id, up to until_id when given."""
+    query = {"room_id": room_id, "sender_id": {"$ne": user_id}}
+    if until_id:
+        query["_id"] = {"$lte": until_id}
+    if last_read_id:
+        query["_id"] = {**query.get("_id", {}), "$gt": last_read_id}
+    else:
+        # rooms read before watermarks existed keep the per message status
+        query["status"] = {"$ne": "seen"}
+    return await mango_sessionmanager.engine.get_collection(Message).count_documents(
+        query
+    )
+
+
+def summary_last_message(message: Message | dict) -> dict:
+    if isinstance(message, Message):
+        message = message.model_dump_doc()
+    text = message.get("message_text")
+    return {
+        "last_message_id": message["_id"],
+        "preview": text[:preview_length] if text else None,
+        "last_message_at": message["created_at"],
+    }
+
+
+async def compute_summaries() -> dict[str, dict]:
+    """Recompute every room summary from the message collection."""
+    messages = mango_sessionmanager.engine.get_collection(Message)
+
+    last_messages = messages.aggregate(
+        [
+            {"$sort": {"_id": -1}},
+            {"$group": {"_id": "$room_id", "message": {"$first": "$$ROOT"}}},
+        ],
+        allowDiskUse=True,
+    )
+    summaries = {
+        row["_id"]: {"room_id": row["_id"], **summary_last_message(row["message"])}
+        async for row in last_messages
+    }
+
+    watermarks = {
+        (row["room_id"], row["user_id"]): row["last_read_id"]
+        async for row in mango_sessionmanager.engine.get_collection(
+            ReadWatermark
+        ).find()
+    }
+
+    members = await get_room_members(list(summaries))
+    for room_id, summary in summaries.items():
+        summary["unread"] = {}
+        for user_id in members.get(room_id, []):
+            unread = await count_unread(
+                room_id, user_id, watermarks.get((room_id, user_id))
+            )
+            if unread:
+                summary["unread"][str(user_id)] = unread
+
+    return summaries
+
+
+async def rebuild_summaries(batch_size: int = 1000) -> int:
+    summaries = list((await compute_summaries()).values())
+    collection = summary_collection()
+    for start in range(0, len(summaries), batch_size):
+        await collection.bulk_write(
+            [
+                ReplaceOne({"room_id": summary["room_id"]}, summary, upsert=True)
+                for summary in summaries[start : start + batch_size]
+            ],
+            ordered=False,
+        )
+    return len(summaries)
+
+
+async def check_summaries() -> list[str]:
+    """Return the room ids whose stored summary differs from the recomputed one."""
+    expected = await compute_summaries()
+    stored = {
+        summary["room_id"]: summary async for summary in summary_collection().find()
+    }
+
+    mismatched = []
+    for room_id in expected.keys() | stored.keys():
+        current, wanted = stored.get(room_id), expected.get(room_id)
+        if current is None or wanted is None:
+            mismatched.append(room_id)
+            continue
+        current_unread = {k: v for k, v in current.get("unread", {}).items() if v}
+        if (
+            current.get("last_message_id") != wanted["last_message_id"]
+            or current_unread != wanted["unread"]
+        ):
+            mismatched.append(room_id)
+
+    return mismatched
+
+
+async def main(command: str) -> None:
+    if command == "rebuild":
+        logger.info(f"rebuilt {await rebuild_summaries()} room summaries")
+    else:
+        mismatched = await check_summaries()
+        logger.info(f"{len(mismatched)} room summaries out of date: {mismatched}")
+    mango_sessionmanager.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="room summary maintenance")
+    parser.add_argument("command", choices=("rebuild", "check"))
+    asyncio.run(main(parser.parse_args().command))
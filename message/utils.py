@@ -1,10 +1,20 @@
 from typing import TypedDict
 
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from account.schemas import UserModel
 from database.mangodb import mango_sessionmanager
-from message.mangomodel import Message
+from message.mangomodel import (
+    Message,
+    ReadWatermark,
+    RoomSummary,
+    valid_message_status,
+)
+from message.schema import MessageStatusChange, ReadReceipt
+from message.summary import record_read_watermark
+from message.writer import message_writer
+from settings import MESSAGE
 
 
 NewMessageDataType = TypedDict(
@@ -13,23 +23,206 @@ NewMessageDataType = TypedDict(
 
 
 async def save_new_message(msg: NewMessageDataType):
-    async with mango_sessionmanager.engine.session() as mangodb:
-        message = Message(**msg)
-        await mangodb.save(message)
-        return message
+    message = Message(**msg)
+    return await message_writer.save(
+        message, wait=not MESSAGE["BROADCAST_BEFORE_FLUSH"]
+    )
 
 
 async def change_msg_status(
     msg_id_list: list[str], msg_status: str, sender_user_id: int
-) -> list[Message]:
-    msg_object_id_list = [ObjectId(msg_id) for msg_id in msg_id_list]
-    async with mango_sessionmanager.engine.session() as mangodb:
-        messages = await mangodb.find(Message, Message.id.in_(msg_object_id_list))
-        print("hello")
-        for msg in messages:
-            if msg.sender_id != sender_user_id:
-                msg.status = msg_status
-
-        await mangodb.save_all(messages)
-
-        return messages
+) -> list[MessageStatusChange]:
+    """
+    Move the messages forward to msg_status with one filtered update. Messages
+    sent by the user, messages already at or past msg_status and messages the
+    user's read watermark covers are skipped, seen lives in the watermarks.
+
+    The candidates are read before the update, so a concurrent receipt of
+    another member can move some of them first and both calls then return
+    them. Status only moves forward, so the extra change events repeat a
+    status the clients already apply idempotently.
+    """
+    if msg_status not in valid_message_status:
+        return []
+    previous_status = valid_message_status[: valid_message_status.index(msg_status)]
+
+    collection = mango_sessionmanager.engine.get_collection(Message)
+    query = {
+        "_id": {"$in": [ObjectId(msg_id) for msg_id in msg_id_list]},
+        "sender_id": {"$ne": sender_user_id},
+        "status": {"$in": previous_status},
+    }
+    changed = await collection.find(query, {"room_id": 1, "sender_id": 1}).to_list(
+        length=None
+    )
+    if changed:
+        changed = await drop_read_messages(changed, sender_user_id)
+    if not changed:
+        return []
+
+    query["_id"] = {"$in": [msg["_id"] for msg in changed]}
+    await collection.update_many(query, {"$set": {"status": msg_status}})
+
+    return [
+        MessageStatusChange(
+            id=str(msg["_id"]),
+            room_id=msg["room_id"],
+            sender_id=msg["sender_id"],
+            status=msg_status,
+        )
+        for msg in changed
+    ]
+
+
+async def drop_read_messages(messages: list[dict], user_id: int) -> list[dict]:
+    """Messages newer than the read watermark of user_id in their room."""
+    watermarks = {
+        mark["room_id"]: mark["last_read_id"]
+        async for mark in mango_sessionmanager.engine.get_collection(
+            ReadWatermark
+        ).find(
+            {
+                "user_id": user_id,
+                "room_id": {"$in": list({msg["room_id"] for msg in messages})},
+            },
+            {"room_id": 1, "last_read_id": 1},
+        )
+    }
+    return [
+        msg
+        for msg in messages
+        if msg["room_id"] not in watermarks or msg["_id"] > watermarks[msg["room_id"]]
+    ]
+
+
+async def mark_room_read(
+    room_id: str, user_id: int, msg_id_list: list[str]
+) -> ReadReceipt | None:
+    """
+    Move the read watermark of the user in the room up to the newest message of
+    the room in msg_id_list, one write however many messages it covers. Returns
+    None when no message matched or the watermark was already there.
+    """
+    if not msg_id_list:
+        return None
+    # ids from the client are only trusted once they resolve to a message of the room
+    newest = (
+        await mango_sessionmanager.engine.get_collection(Message)
+        .find(
+            {
+                "_id": {"$in": [ObjectId(msg_id) for msg_id in msg_id_list]},
+                "room_id": room_id,
+            },
+            {"_id": 1},
+        )
+        .sort("_id", -1)
+        .limit(1)
+        .to_list(length=1)
+    )
+    if not newest:
+        return None
+    last_read_id = newest[0]["_id"]
+
+    collection = mango_sessionmanager.engine.get_collection(ReadWatermark)
+    previous = await collection.find_one_and_update(
+        {"room_id": room_id, "user_id": user_id},
+        [
+            {
+                "$set": {
+                    "last_read_id": {"$max": ["$last_read_id", last_read_id]},
+                    "updated_at": "$$NOW",
+                }
+            }
+        ],
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+    )
+    previous_read_id = previous["last_read_id"] if previous else None
+    if previous_read_id and previous_read_id >= last_read_id:
+        return None
+
+    await record_read_watermark(room_id, user_id, previous_read_id, last_read_id)
+    return ReadReceipt(room_id=room_id, user_id=user_id, last_read_id=str(last_read_id))
+
+
+async def apply_read_state(room_id: str, messages: list[Message]) -> list[Message]:
+    """Mark messages as seen when another member's watermark has passed them."""
+    watermarks = (
+        await mango_sessionmanager.engine.get_collection(ReadWatermark)
+        .find({"room_id": room_id}, {"user_id": 1, "last_read_id": 1})
+        .to_list(length=None)
+    )
+    for msg in messages:
+        if msg.status != "seen" and any(
+            mark["user_id"] != msg.sender_id and mark["last_read_id"] >= msg.id
+            for mark in watermarks
+        ):
+            msg.status = "seen"
+    return messages
+
+
+def history_pipeline(user_id: int) -> list[dict]:
+    """
+    Every room of the user with its last message, the unread count of the user
+    and whether another member has read the last message, sorted by the last
+    activity (message id, or room id for empty rooms).
+    """
+    return [
+        {"$match": {"users.user_id": user_id}},
+        {
+            "$lookup": {
+                "from": RoomSummary.__collection__,
+                "let": {"room_id": {"$toString": "$_id"}},
+                "pipeline": [{"$match": {"$expr": {"$eq": ["$room_id", "$$room_id"]}}}],
+                "as": "summary",
+            }
+        },
+        {"$addFields": {"summary": {"$first": "$summary"}}},
+        {
+            "$lookup": {
+                "from": Message.__collection__,
+                "localField": "summary.last_message_id",
+                "foreignField": "_id",
+                "as": "message",
+            }
+        },
+        {
+            "$addFields": {
+                "message": {"$first": "$message"},
+                "quantity": {
+                    "$max": [0, {"$ifNull": [f"$summary.unread.{user_id}", 0]}]
+                },
+                "last_activity": {"$ifNull": ["$summary.last_message_id", "$_id"]},
+            }
+        },
+        # seen receipts only move watermarks, the last message is seen once
+        # another member's watermark reached it
+        {
+            "$lookup": {
+                "from": ReadWatermark.__collection__,
+                "let": {
+                    "room_id": {"$toString": "$_id"},
+                    "message_id": "$message._id",
+                    "sender_id": "$message.sender_id",
+                },
+                "pipeline": [
+                    {
+                        "$match": {
+                            "$expr": {
+                                "$and": [
+                                    {"$eq": ["$room_id", "$$room_id"]},
+                                    {"$ne": ["$user_id", "$$sender_id"]},
+                                    {"$gte": ["$last_read_id", "$$message_id"]},
+                                ]
+                            }
+                        }
+                    },
+                    {"$limit": 1},
+                    {"$project": {"_id": 1}},
+                ],
+                "as": "read_by",
+            }
+        },
+        {"$sort": {"last_activity": -1}},
+        {"$project": {"summary": 0, "last_activity": 0}},
+    ]
@@ -0,0 +1,107 @@
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from database.mangodb import mango_sessionmanager
+from logger import logger
+from message.mangomodel import Message
+from message.summary import record_new_messages
+from settings import MESSAGE
+
+
+class MessageWriter:
+    """
+    Group commit for new messages. Messages from every room are collected for
+    up to flush_interval seconds or max_batch messages and written with one
+    ordered insert_many, so the per room order is kept in the collection.
+    The message id is assigned on creation so callers can use it right away.
+    """
+
+    def __init__(self, flush_interval: float, max_batch: int) -> None:
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.pending: list[tuple[Message, asyncio.Future | None]] = []
+        self.has_pending = asyncio.Event()
+        self.batch_full = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.flushing: asyncio.Task | None = None
+
+    async def save(self, message: Message, wait: bool = True) -> Message:
+        """Queue a message, wait=False returns before the batch is flushed."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+        future = asyncio.get_running_loop().create_future() if wait else None
+        self.pending.append((message, future))
+        self.has_pending.set()
+        if len(self.pending) >= self.max_batch:
+            self.batch_full.set()
+
+        if future:
+            await future
+        return message
+
+    async def run(self) -> None:
+        while True:
+            await self.has_pending.wait()
+            try:
+                await asyncio.wait_for(self.batch_full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            # shielded so shutdown never interrupts a batch half way
+            self.flushing = asyncio.create_task(self.flush())
+            await asyncio.shield(self.flushing)
+
+    async def flush(self) -> None:
+        batch, self.pending = self.pending, []
+        self.has_pending.clear()
+        self.batch_full.clear()
+
+        for start in range(0, len(batch), self.max_batch):
+            await self.insert(batch[start : start + self.max_batch])
+
+    @staticmethod
+    async def insert(batch: list[tuple[Message, asyncio.Future | None]]) -> None:
+        collection = mango_sessionmanager.engine.get_collection(Message)
+        inserted = len(batch)
+        error = None
+        try:
+            await collection.insert_many(
+                [message.model_dump_doc() for message, _ in batch], ordered=True
+            )
+        except BulkWriteError as exc:
+            inserted = exc.details.get("nInserted", 0)
+            error = exc
+        except Exception as exc:
+            inserted = 0
+            error = exc
+
+        if error:
+            logger.error(f"failed to save {len(batch) - inserted} messages: {error}")
+
+        if inserted:
+            try:
+                await record_new_messages([message for message, _ in batch[:inserted]])
+            except Exception as exc:
+                logger.error(f"failed to update room summaries: {exc}")
+
+        for index, (_, future) in enumerate(batch):
+            if future is None or future.done():
+                continue
+            if index < inserted:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    async def close(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.flushing:
+            await self.flushing
+        await self.flush()
+
+
+message_writer = MessageWriter(
+    MESSAGE["WRITE_FLUSH_INTERVAL"], MESSAGE["WRITE_BATCH_SIZE"]
+)
@@ -1,6 +1,7 @@
 import enum
+from datetime import datetime, timezone
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, DateTime
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.dialects.postgresql import ENUM as PGENUM
 from sqlalchemy.orm import Mapped, mapped_column
@@ -8,7 +9,6 @@ from sqlalchemy.orm import relationship
 
 from account.models import User
 from database.base import Base
-from message.mangomodel import formated_date
 from sqlalchemy.ext.mutable import MutableDict
 
 
@@ -35,7 +35,9 @@ class Notification(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     is_read: Mapped[bool] = mapped_column(default=False)
-    created_at: Mapped[str] = mapped_column(default=formated_date())
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
     read_at: Mapped[str] = mapped_column(default=None, nullable=True)
     notification_type: Mapped[NotificationType] = mapped_column(
         PGENUM(NotificationType, name="notification_type"),
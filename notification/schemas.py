@@ -1,13 +1,16 @@
-from pydantic import BaseModel
+from datetime import datetime
+
+from pydantic import BaseModel, field_serializer
 
 from account.schemas import UserModel
+from message.mangomodel import formated_date
 from notification.models import NotificationType
 
 
 class NotificationModel(BaseModel):
     id: int
     is_read: bool
-    created_at: str
+    created_at: datetime
     read_at: str | None = None
     notification_type: NotificationType
     message: str
@@ -19,6 +22,10 @@ class NotificationModel(BaseModel):
     receiver_user: UserModel | None = None
     linked_notification: "NotificationModel | None" = None
 
+    @field_serializer("created_at", when_used="json")
+    def serialize_created_at(self, v: datetime) -> str:
+        return formated_date(v)
+
 
 class NotificationPatchModel(BaseModel):
     is_read: bool | None = None
@@ -1,22 +1,31 @@
-from typing import Coroutine, cast, Sequence, Type, Generic, TypeVar
+from typing import Coroutine, cast, Sequence, Type, Generic, TypeVar, NamedTuple
 
-from sqlalchemy import select
+from sqlalchemy import select, exists, literal, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload, raiseload
 
-from account.models import User
+from account.models import User, Friend, RequestedUser, BlockedUser
 from notification.models import Notification
 from abc import ABC, abstractmethod
 
 T = TypeVar("T")
 
+# relationship name -> loader strategy
+Relations = dict[str, str]
+
+loader_strategies = {"joined": joinedload, "selectin": selectinload}
+
+
+def selectin(*relations: str) -> Relations:
+    return dict.fromkeys(relations, "selectin")
+
 
 class Query(Generic[T], ABC):
     def __init__(
         self,
         db: AsyncSession,
         filter_data: dict | None = None,
-        options: bool = True,
+        options: bool | Relations = True,
         limit: int | None = None,
         offset: int | None = None,
         order_by: tuple[str, str] | None = None,
@@ -27,6 +36,8 @@ class Query(Generic[T], ABC):
             if order_by[1] not in ("asc", "desc"):
                 raise ValueError("order_by[1] must be 'asc' or 'desc'")
             self.validate_model_attribute((order_by[0],), self.data_model)
+        if isinstance(options, dict):
+            self.validate_relations(options, self.data_model)
         self.db = db
         self.filter_data = filter_data
         self.options = options
@@ -39,6 +50,19 @@ class Query(Generic[T], ABC):
         if not all([hasattr(model, k) for k in data]):
             raise AttributeError(f"{data} is not a valid attribute of {model.__name__}")
 
+    @staticmethod
+    def validate_relations(relations: Relations, model: T):
+        mapper_relations = model.__mapper__.relationships
+        for name, strategy in relations.items():
+            if name not in mapper_relations:
+                raise AttributeError(
+                    f"{name} is not a relationship of {model.__name__}"
+                )
+            if strategy not in loader_strategies:
+                raise ValueError(
+                    f"loader strategy must be one of {tuple(loader_strategies)}"
+                )
+
     @property
     @abstractmethod
     def data_model(self) -> T:
@@ -57,7 +81,14 @@ class Query(Generic[T], ABC):
                     raise AttributeError(
                         f"{k} is not a valid attribute of {self.data_model.__name__}"
                     )
-        if self.options:
+        if isinstance(self.options, dict):
+            # only the named relationships are loaded, touching any other raises
+            for name, strategy in self.options.items():
+                query = query.options(
+                    loader_strategies[strategy](getattr(self.data_model, name))
+                )
+            query = query.options(raiseload("*"))
+        elif self.options:
             for relation in self.data_model.__mapper__.relationships.items():
                 query = query.options(joinedload(getattr(self.data_model, relation[0])))
         if self.order_by:
@@ -80,7 +111,7 @@ class Query(Generic[T], ABC):
 
     @classmethod
     async def one(
-        cls, db: AsyncSession, model_id: int, option: bool = True
+        cls, db: AsyncSession, model_id: int, option: bool | Relations = True
     ) -> T | None:
         return (await cls(db, {"id": model_id}, option).get_data()).one_or_none()
 
@@ -95,11 +126,115 @@ class Query(Generic[T], ABC):
         return (await self.get_data()).one_or_none()
 
 
+class RelationStatus(NamedTuple):
+    """How user a relates to user b, fields are named after the User relationships."""
+
+    friend: bool
+    friend_by: bool
+    requested_user: bool
+    requested_by: bool
+    blocked_user: bool
+    blocked_by: bool
+
+    @property
+    def is_friend(self) -> bool:
+        return self.friend or self.friend_by
+
+
+class RelationIndex(NamedTuple):
+    """Ids of the users related to one user, named after the User relationships."""
+
+    friend: set[int]
+    friend_by: set[int]
+    requested_user: set[int]
+    requested_by: set[int]
+    blocked_user: set[int]
+    blocked_by: set[int]
+
+    def search_status(self, user_id: int) -> str:
+        if user_id in self.friend or user_id in self.friend_by:
+            return "friend"
+        elif user_id in self.requested_user:
+            return "requested"
+        elif user_id in self.requested_by:
+            return "requested_by"
+        elif user_id in self.blocked_user:
+            return "blocked"
+        return "none"
+
+
 class UserQuery(Query[Type[User]]):
     data_model = User
 
+    all_relations = selectin(
+        "friend",
+        "friend_by",
+        "requested_user",
+        "requested_by",
+        "blocked_user",
+        "blocked_by",
+    )
+
+    @staticmethod
+    async def relation_status(
+        db: AsyncSession, user_id: int, other_user_id: int
+    ) -> RelationStatus:
+        """Every relationship between two users in one query of EXISTS checks."""
+
+        def pair_exists(column, other_column, first: int, second: int):
+            return exists().where(column == first, other_column == second)
+
+        pairs = (
+            (Friend.user_id, Friend.friend_user_id),
+            (RequestedUser.user_id, RequestedUser.requested_user_id),
+            (BlockedUser.user_id, BlockedUser.blocked_user_id),
+        )
+        query = select(
+            *(
+                pair_exists(column, other_column, first, second)
+                for column, other_column in pairs
+                for first, second in (
+                    (user_id, other_user_id),
+                    (other_user_id, user_id),
+                )
+            )
+        )
+        return RelationStatus(*(await db.execute(query)).one())
+
+    @staticmethod
+    async def relation_index(db: AsyncSession, user_id: int) -> RelationIndex:
+        """Every related user id of user_id from one query that selects ids only."""
+        pairs = (
+            (Friend.user_id, Friend.friend_user_id, "friend", "friend_by"),
+            (
+                RequestedUser.user_id,
+                RequestedUser.requested_user_id,
+                "requested_user",
+                "requested_by",
+            ),
+            (
+                BlockedUser.user_id,
+                BlockedUser.blocked_user_id,
+                "blocked_user",
+                "blocked_by",
+            ),
+        )
+        parts = []
+        for column, other_column, name, reverse_name in pairs:
+            parts.append(select(literal(name), other_column).where(column == user_id))
+            parts.append(
+                select(literal(reverse_name), column).where(other_column == user_id)
+            )
+
+        index = RelationIndex(*(set() for _ in RelationIndex._fields))
+        for name, related_id in await db.execute(union_all(*parts)):
+            getattr(index, name).add(related_id)
+        return index
+
     @classmethod
-    async def one_by_uid(cls, db: AsyncSession, uid: str, option: bool = True) -> User:
+    async def one_by_uid(
+        cls, db: AsyncSession, uid: str, option: bool | Relations = True
+    ) -> User:
         return (await cls(db, {"uid": uid}, option).get_data()).one_or_none()
 
 
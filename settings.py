@@ -24,6 +24,54 @@ JWT = {
     "ALGORITHM": "HS256",
 }
 
+# Most contacts accepted by one /account/contacts/match request
+CONTACT_MATCH_LIMIT = 5000
+
+# bcrypt runs on a thread pool, requests past WORKERS + MAX_PENDING get a 503
+PASSWORD_HASHING = {
+    "WORKERS": 4,
+    "MAX_PENDING": 64,
+    # new hashes use SCHEME at ROUNDS cost, any other hash is replaced on login.
+    # ROUNDS is in the unit of the scheme and required for schemes other than
+    # bcrypt, whose default is 12, see python -m auth.hashing calibrate
+    "SCHEME": config.get("PASSWORD_HASH_SCHEME", "bcrypt"),
+    "ROUNDS": (
+        int(config["PASSWORD_HASH_ROUNDS"])
+        if config.get("PASSWORD_HASH_ROUNDS")
+        else None
+    ),
+    "LEGACY_SCHEMES": ["bcrypt"],
+}
+
 STATIC = "files"
 
 STATICFILES_DIR = os.path.join(BASE_DIR, STATIC)
+
+# For websocket fan-out between workers, "memory" or "broker"
+WEBSOCKET = {
+    "FANOUT_BACKEND": config.get("WEBSOCKET_FANOUT_BACKEND", "memory"),
+    "BROKER_URL": config.get("WEBSOCKET_BROKER_URL", "tcp://127.0.0.1:8765"),
+    "BROKER_CHANNEL": "ws",
+    # pending frames per connection, slow consumer policy "drop_oldest" or "disconnect"
+    "OUTBOUND_QUEUE_SIZE": 100,
+    "SLOW_CONSUMER_POLICY": "drop_oldest",
+    # seconds read receipts of a user and room are merged for, 0 disables it
+    "RECEIPT_COALESCE_WINDOW": 0.3,
+    # push friend online/offline changes to the main websocket
+    "PRESENCE_PUSH": True,
+    # seconds between presence heartbeats, a worker silent for 3 of them is offline
+    "PRESENCE_HEARTBEAT": 10,
+}
+
+# Write-behind batching of new chat messages
+MESSAGE = {
+    "WRITE_FLUSH_INTERVAL": 0.02,
+    "WRITE_BATCH_SIZE": 500,
+    # True broadcasts a new message before its batch is stored in mongo
+    "BROADCAST_BEFORE_FLUSH": False,
+    # in-process cache of room status and members
+    "ROOM_CACHE_TTL": 60,
+    "ROOM_CACHE_SIZE": 10000,
+    # most messages returned by one /message/msg/{room_id} page
+    "PAGE_SIZE_LIMIT": 200,
+}
@@ -0,0 +1,45 @@
+import contextlib
+import os
+from uuid import uuid4
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from odmantic import AIOEngine
+
+from bench.utils import throwaway_postgres
+
+
+@pytest.fixture
+def mongo_engine():
+    """
+    Factory of an engine on a throwaway database, entered inside the event loop
+    of the test. Tests using it are skipped unless TEST_MANGODB_URL is set.
+    """
+    url = os.environ.get("TEST_MANGODB_URL")
+    if not url:
+        pytest.skip("TEST_MANGODB_URL is not set")
+
+    @contextlib.asynccontextmanager
+    async def engine():
+        client = AsyncIOMotorClient(url)
+        database = f"test_{uuid4().hex}"
+        try:
+            yield AIOEngine(client=client, database=database)
+        finally:
+            await client.drop_database(database)
+            client.close()
+
+    return engine
+
+
+@pytest.fixture
+def postgres_sessions():
+    """
+    Factory of a session maker on a throwaway schema with every table, entered
+    inside the event loop of the test. Tests using it are skipped unless
+    TEST_DATABASE_URL is set.
+    """
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    return lambda: throwaway_postgres(url)
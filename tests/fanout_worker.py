@@ -0,0 +1,51 @@
+"""
+One worker of the multi-process fan-out test. It holds a socket of --user,
+prints every frame written to it, starting with "ready" once subscribed, and
+publishes the commands read from stdin:
+    room <room_id> <user_id,user_id> <text>
+    user <user_id> <text>
+"""
+
+import argparse
+import asyncio
+import sys
+
+import websocket.manager.fanout as fanout_module
+from websocket.manager.connections import deliver
+from websocket.manager.fanout import BrokerBackend, publish_to_room, publish_to_user
+from websocket.manager.registry import Connection, registry
+from websocket.schema import EncodedFrame
+
+
+class RecordingWebSocket:
+    async def send_text(self, text: str) -> None:
+        print(f"frame {text}", flush=True)
+
+
+async def main(port: int, user_id: int) -> None:
+    backend = BrokerBackend(f"tcp://127.0.0.1:{port}", "ws")
+    fanout_module.fanout = backend
+    await backend.start(deliver)
+    registry.add_user(Connection(RecordingWebSocket(), user_id))
+    # the echo of this frame means the broker has processed the subscription
+    await publish_to_user(user_id, EncodedFrame("ready"))
+
+    loop = asyncio.get_running_loop()
+    while line := await loop.run_in_executor(None, sys.stdin.readline):
+        command, args = line.split(maxsplit=1)
+        if command == "room":
+            room_id, users, text = args.split(maxsplit=2)
+            room_users = [int(usr) for usr in users.split(",")]
+            await publish_to_room(room_id, room_users, EncodedFrame(text.strip()))
+        elif command == "user":
+            target, text = args.split(maxsplit=1)
+            await publish_to_user(int(target), EncodedFrame(text.strip()))
+    await backend.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--user", type=int, required=True)
+    args = parser.parse_args()
+    asyncio.run(main(args.port, args.user))
@@ -0,0 +1,120 @@
+import asyncio
+
+from auth.hashing import build_context
+from bench import (
+    contacts,
+    friends,
+    history,
+    login_burst,
+    message_pages,
+    name_search,
+    receipts,
+    relation_search,
+    registry_memory,
+    serialization,
+)
+from query import UserQuery
+
+
+def test_serialization_paths_deliver_the_same_frames():
+    old, new = asyncio.run(serialization.compare(recipients=5, broadcasts=3))
+    assert old > 0 and new > 0
+
+
+def test_registry_memory_removes_every_connection():
+    result = asyncio.run(
+        registry_memory.measure(
+            connections=100, devices=2, rooms_per_connection=3, rooms=10
+        )
+    )
+    assert result["index_bytes"] > 0
+
+
+def test_login_burst_answers_every_login():
+    context = build_context("bcrypt", 4, [])
+    for mode in ("inline", "pooled"):
+        result = login_burst.run(
+            mode, logins=4, pings=5, interval_ms=1, context=context
+        )
+        assert result["ok"] == 4
+
+
+def test_message_pages_agree_at_every_depth(mongo_engine):
+    async def check():
+        async with mongo_engine() as engine:
+            await message_pages.seed(engine, 300, batch=100)
+            results = await message_pages.measure(
+                engine, [0, 50, 250], limit=20, repeat=2
+            )
+            assert list(results) == [0, 50, 250]
+
+    asyncio.run(check())
+
+
+def test_history_paths_return_every_room(mongo_engine):
+    async def check():
+        async with mongo_engine() as engine:
+            await history.seed(engine, rooms=20, messages_per_room=3, other_rooms=5)
+            await history.measure(engine, rooms=20, repeat=1)
+
+    asyncio.run(check())
+
+
+def test_receipts_skip_own_and_moved_messages(mongo_engine):
+    async def check():
+        async with mongo_engine() as engine:
+            id_batches = await receipts.seed(engine, batches=4, batch_size=50)
+            results = await receipts.measure(engine, id_batches)
+            assert results["load and save"][1] == 50
+            assert results["filtered update"][1] == 40
+
+    asyncio.run(check())
+
+
+def test_friends_loaders_see_every_friend(postgres_sessions):
+    async def check():
+        async with postgres_sessions() as sessions:
+            await friends.seed(sessions, friends=30, requests=3, blocked=1)
+            async with sessions() as db:
+                user = await UserQuery.one(db, friends.user_id, UserQuery.all_relations)
+                index = await UserQuery.relation_index(db, friends.user_id)
+            assert len(user.friend) == len(index.friend) == 30
+            assert len(index.requested_by) == 3
+            await friends.measure(sessions, repeat=1)
+
+    asyncio.run(check())
+
+
+def test_relation_search_classifies_like_the_lists(postgres_sessions):
+    async def check():
+        async with postgres_sessions() as sessions:
+            await relation_search.seed(
+                sessions, users=200, friends=40, requests=10, blocked=5
+            )
+            results = await relation_search.with_relation_index(sessions, "a", 100)
+            assert {usr.friend_status for usr in results} >= {"friend", "none"}
+            await relation_search.measure(sessions, "a", limit=100, repeat=1)
+
+    asyncio.run(check())
+
+
+def test_name_searches_find_a_seeded_name(postgres_sessions):
+    async def check():
+        async with postgres_sessions() as sessions:
+            await name_search.seed(sessions, users=2_000)
+            results = await name_search.measure(sessions, ["Sita"], limit=10, repeat=1)
+            assert results["Sita"]["ilike"][1] == 10
+            assert results["Sita"]["trigram"][1] == 10
+
+    asyncio.run(check())
+
+
+def test_contact_match_finds_the_registered_numbers(postgres_sessions):
+    async def check():
+        async with postgres_sessions() as sessions:
+            await contacts.seed(sessions, users=300, friends=10)
+            book = contacts.contact_book(300, numbers=50, registered=0.5)
+            results = await contacts.measure(sessions, book, repeat=1)
+            assert results["one match query"][1] == 25
+
+    asyncio.run(check())
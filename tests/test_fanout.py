@@ -0,0 +1,118 @@
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+root = Path(__file__).resolve().parent.parent
+timeout = 10
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"broker did not listen on {port}")
+
+
+class Worker:
+    """A worker process holding one user's socket, see tests/fanout_worker.py."""
+
+    def __init__(self, port: int, user_id: int) -> None:
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "tests.fanout_worker",
+                "--port",
+                str(port),
+                "--user",
+                str(user_id),
+            ],
+            cwd=root,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        self.lines: queue.Queue[str] = queue.Queue()
+        threading.Thread(target=self.read, daemon=True).start()
+
+    def read(self) -> None:
+        for line in self.process.stdout:
+            self.lines.put(line.strip())
+
+    def next_line(self) -> str:
+        return self.lines.get(timeout=timeout)
+
+    def send(self, command: str) -> None:
+        self.process.stdin.write(command + "\n")
+        self.process.stdin.flush()
+
+    def stop(self) -> None:
+        self.process.kill()
+        self.process.wait()
+
+
+@pytest.fixture
+def broker_port():
+    port = free_port()
+    broker = subprocess.Popen(
+        [sys.executable, "-m", "websocket.broker", "--port", str(port)],
+        cwd=root,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+        yield port
+    finally:
+        broker.kill()
+        broker.wait()
+
+
+def test_room_message_reaches_users_on_other_workers(broker_port):
+    first, second = Worker(broker_port, 1), Worker(broker_port, 2)
+    try:
+        assert first.next_line() == "frame ready"
+        assert second.next_line() == "frame ready"
+
+        first.send('room room-1 1,2 {"msg":"hello"}')
+        assert first.next_line() == 'frame {"msg":"hello"}'
+        assert second.next_line() == 'frame {"msg":"hello"}'
+
+        # a user frame is written only by the worker holding that user
+        first.send('user 2 {"msg":"private"}')
+        first.send('user 1 {"msg":"done"}')
+        assert second.next_line() == 'frame {"msg":"private"}'
+        assert first.next_line() == 'frame {"msg":"done"}'
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_large_frame_is_delivered(broker_port):
+    first, second = Worker(broker_port, 1), Worker(broker_port, 2)
+    try:
+        assert first.next_line() == "frame ready"
+        assert second.next_line() == "frame ready"
+
+        text = "x" * 200_000
+        first.send(f"user 2 {text}")
+        assert second.next_line() == f"frame {text}"
+    finally:
+        first.stop()
+        second.stop()
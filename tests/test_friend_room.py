@@ -0,0 +1,60 @@
+import asyncio
+
+from account.utils import create_room
+from database.indexes import sync_indexes
+from message.mangomodel import ChatRoom, RoomUser
+from websocket.manager.fanout import fanout
+
+
+async def ignore(envelope: dict) -> None:
+    pass
+
+
+async def accept_concurrently(engine, requests: int) -> list[ChatRoom]:
+    async def accept(first_user_id: int, second_user_id: int) -> ChatRoom:
+        async with engine.session() as session:
+            return await create_room(session, first_user_id, second_user_id, "friend")
+
+    await fanout.start(ignore)
+    try:
+        return await asyncio.gather(
+            *(accept(1, 2) if i % 2 else accept(2, 1) for i in range(requests))
+        )
+    finally:
+        await fanout.close()
+
+
+def test_concurrent_accepts_create_one_room(mongo_engine):
+    async def check():
+        async with mongo_engine() as engine:
+            await sync_indexes(engine, [ChatRoom])
+            rooms = await accept_concurrently(engine, 20)
+
+            assert len({room.id for room in rooms}) == 1
+            assert await engine.count(ChatRoom) == 1
+            assert rooms[0].pair_key == "1:2"
+
+    asyncio.run(check())
+
+
+def test_concurrent_accepts_reuse_a_legacy_room(mongo_engine):
+    async def check():
+        async with mongo_engine() as engine:
+            await sync_indexes(engine, [ChatRoom])
+            legacy = await engine.save(
+                ChatRoom(
+                    users=[
+                        RoomUser(user_id=1, isAdmin=True),
+                        RoomUser(user_id=2, isAdmin=True),
+                    ],
+                    type="friend",
+                    is_active=False,
+                )
+            )
+            rooms = await accept_concurrently(engine, 20)
+
+            assert {room.id for room in rooms} == {legacy.id}
+            assert await engine.count(ChatRoom) == 1
+            assert all(room.is_active for room in rooms)
+
+    asyncio.run(check())
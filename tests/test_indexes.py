@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from auth.mangomodel import OutstandingRefreshToken, BlackListedRefreshToken
+from database.indexes import mongo_models, sync_indexes
+from message.mangomodel import ChatRoom, Message, RoomSummary, ReadWatermark
+
+# model, filter, sort, index expected to serve it (None: any index)
+hot_queries = [
+    (Message, {"room_id": "room"}, [("_id", -1)], "room_id_id"),
+    (
+        Message,
+        {"room_id": "room", "_id": {"$gt": ObjectId("0" * 24)}},
+        [("_id", 1)],
+        None,
+    ),
+    (ChatRoom, {"users.user_id": 1}, None, "users_user_id"),
+    (ChatRoom, {"pair_key": "1:2"}, None, "pair_key"),
+    (ReadWatermark, {"room_id": "room"}, None, "room_id_user_id"),
+    (ReadWatermark, {"room_id": "room", "user_id": 1}, None, "room_id_user_id"),
+    (RoomSummary, {"room_id": "room"}, None, None),
+    (OutstandingRefreshToken, {"token": "token"}, None, None),
+    (BlackListedRefreshToken, {"token": "token"}, None, None),
+]
+
+
+def plan_values(plan, key: str) -> set[str]:
+    """Every value of key in an explain plan, nested stages included."""
+    values = set()
+    if isinstance(plan, dict):
+        for name, value in plan.items():
+            if name == key and isinstance(value, str):
+                values.add(value)
+            else:
+                values |= plan_values(value, key)
+    elif isinstance(plan, list):
+        for item in plan:
+            values |= plan_values(item, key)
+    return values
+
+
+@pytest.mark.parametrize(
+    "model, query, sort, index",
+    hot_queries,
+    ids=[f"{query[0].__name__}-{','.join(query[1])}" for query in hot_queries],
+)
+def test_hot_query_uses_an_index(mongo_engine, model, query, sort, index):
+    async def check():
+        async with mongo_engine() as engine:
+            await sync_indexes(engine, [model])
+            cursor = engine.get_collection(model).find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+
+            stages = plan_values(plan, "stage")
+            assert "COLLSCAN" not in stages
+            assert any("IXSCAN" in stage for stage in stages), stages
+            if index:
+                assert index in plan_values(plan, "indexName")
+
+    asyncio.run(check())
+
+
+def test_sync_indexes_is_idempotent(mongo_engine):
+    async def check():
+        async with mongo_engine() as engine:
+            first = await sync_indexes(engine)
+            second = await sync_indexes(engine)
+
+            assert all(report["created"] for report in first.values())
+            for report in second.values():
+                assert report == {"created": [], "changed": [], "undeclared": []}
+            assert len(second) == len(mongo_models)
+
+    asyncio.run(check())
@@ -0,0 +1,54 @@
+import asyncio
+import json
+from unittest import mock
+
+from websocket.manager.connections import room_connections
+from websocket.manager.main_manager import MainConnectionManager
+from websocket.manager.registry import registry
+from websocket.manager.room_manager import RoomManager
+
+
+class IdleWebSocket:
+    async def send_text(self, text: str) -> None:
+        pass
+
+
+def new_message(sender_id: int) -> str:
+    return json.dumps(
+        {
+            "event_type": "new_message",
+            "room_id": "room",
+            "data": {"message_text": "hello"},
+            "sender_user": {
+                "id": sender_id,
+                "uid": "uid",
+                "username": f"user{sender_id}",
+                "profile": "http://127.0.0.1/files/profile.png",
+                "email": f"user{sender_id}@example.com",
+                "first_name": "first",
+                "last_name": "last",
+                "contact_number_country_code": 977,
+                "contact_number": 9800000000 + sender_id,
+                "address": "address",
+            },
+        }
+    )
+
+
+def test_subscribed_room_frames_must_come_from_the_connected_user():
+    async def check():
+        con = MainConnectionManager(IdleWebSocket(), 1)
+        registry.add_user(con)
+        RoomManager.join("room", con)
+        try:
+            with mock.patch.object(RoomManager, "handle_event") as handle_event:
+                await con.handle_msg(new_message(sender_id=2))
+                handle_event.assert_not_called()
+
+                await con.handle_msg(new_message(sender_id=1))
+                handle_event.assert_called_once()
+        finally:
+            con.disconnect()
+        assert "room" not in room_connections
+
+    asyncio.run(check())
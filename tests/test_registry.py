@@ -0,0 +1,57 @@
+import asyncio
+
+from websocket.manager.main_manager import MainConnectionManager as MainConnection
+from websocket.manager.registry import Connection, ConnectionRegistry
+
+
+class IdleWebSocket:
+    async def send_text(self, text: str) -> None:
+        pass
+
+
+def connections(*cons: tuple[type[Connection], int]) -> list[Connection]:
+    return [cls(IdleWebSocket(), user_id) for cls, user_id in cons]
+
+
+def test_room_frame_reaches_every_device_of_a_member():
+    async def check():
+        registry = ConnectionRegistry()
+        phone, desktop = connections((MainConnection, 1), (MainConnection, 1))
+        registry.add_user(phone)
+        registry.add_user(desktop)
+        # the phone has the room open over its main socket
+        registry.join_room("room", phone)
+
+        assert registry.room_recipients("room", [1]) == {phone, desktop}
+
+    asyncio.run(check())
+
+
+def test_legacy_room_socket_replaces_the_main_sockets():
+    async def check():
+        registry = ConnectionRegistry()
+        main, room_socket, other = connections(
+            (MainConnection, 1), (Connection, 1), (MainConnection, 2)
+        )
+        registry.add_user(main)
+        registry.add_user(other)
+        registry.join_room("room", room_socket)
+
+        assert registry.room_recipients("room", [1, 2]) == {room_socket, other}
+
+    asyncio.run(check())
+
+
+def test_remove_drops_the_connection_from_its_rooms():
+    async def check():
+        registry = ConnectionRegistry()
+        first, second = connections((MainConnection, 1), (MainConnection, 1))
+        registry.add_user(first)
+        registry.add_user(second)
+        registry.join_room("room", first)
+
+        assert registry.remove(first) == ["room"]
+        assert registry.room_recipients("room", [1]) == {second}
+        assert registry.is_online(1)
+
+    asyncio.run(check())
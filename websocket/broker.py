@@ -0,0 +1,75 @@
+"""
+Minimal pub/sub broker for the websocket fan-out.
+
+Workers connect over tcp and exchange newline delimited json:
+    {"op": "subscribe", "channel": "ws"}
+    {"op": "publish", "channel": "ws", "data": {...}}
+Every publish is forwarded as is to all subscribers of the channel. Lines are
+limited to max_line bytes on both ends, a longer line closes the connection.
+
+Run it with: python -m websocket.broker --host 127.0.0.1 --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+
+from logger import logger
+
+# stream reader limit, asyncio's 64 KiB default is below a long chat message
+max_line = 16 * 1024 * 1024
+
+
+class Broker:
+    def __init__(self) -> None:
+        self.channels: dict[str, set[asyncio.StreamWriter]] = {}
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        subscribed: set[str] = set()
+        try:
+            while line := await reader.readline():
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+
+                if data.get("op") == "subscribe":
+                    subscribed.add(data["channel"])
+                    self.channels.setdefault(data["channel"], set()).add(writer)
+                elif data.get("op") == "publish":
+                    await self.forward(data["channel"], line)
+        except ConnectionError:
+            pass
+        except ValueError as exc:
+            logger.warning(f"websocket broker dropped a client: {exc}")
+        finally:
+            for channel in subscribed:
+                self.channels.get(channel, set()).discard(writer)
+            writer.close()
+
+    async def forward(self, channel: str, line: bytes) -> None:
+        subscribers = list(self.channels.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.write(line)
+        await asyncio.gather(
+            *(subscriber.drain() for subscriber in subscribers),
+            return_exceptions=True,
+        )
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(
+            self.handle_client, host, port, limit=max_line
+        )
+        logger.info(f"websocket broker listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="websocket fan-out broker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(Broker().serve(args.host, args.port))
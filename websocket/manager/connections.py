@@ -1,3 +1,40 @@
-main_connections = {}
+from message.cache import room_cache
+from websocket.schema import EncodedFrame
+from .presence import presence
+from .registry import registry
 
-room_connections = {}
\ No newline at end of file
+room_connections = {}
+
+
+async def deliver(envelope: dict) -> None:
+    """Write a fanned-out envelope to the sockets held by this worker only."""
+    target = envelope.get("target")
+    frame = EncodedFrame(envelope["frame"]) if "frame" in envelope else None
+
+    if target == "user":
+        for con in registry.user_connections(envelope["user_id"]):
+            con.send_frame(frame)
+
+    elif target == "room":
+        for con in registry.room_recipients(
+            envelope["room_id"], envelope["room_users"]
+        ):
+            con.send_frame(frame)
+
+    elif target == "room_changed":
+        room_cache.invalidate(envelope["room_id"])
+        presence.refresh_room_later(envelope["room_id"])
+
+    elif target == "presence":
+        presence.apply(envelope["user_id"], envelope["worker_id"], envelope["online"])
+
+    elif target == "presence_heartbeat":
+        presence.apply_heartbeat(envelope["worker_id"], envelope["user_ids"])
+
+    elif target == "presence_sync":
+        presence.apply_sync(envelope["worker_id"])
+
+    elif target == "close_room":
+        room = room_connections.get(envelope["room_id"])
+        if room:
+            await room.close_room()
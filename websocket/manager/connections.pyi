@@ -1,5 +1,5 @@
-from websocket.manager.main_manager import MainConnectionManager
 from websocket.manager.room_manager import RoomManager
 
-main_connections: dict[int, MainConnectionManager]
-room_connections: dict[str, RoomManager]
\ No newline at end of file
+room_connections: dict[str, RoomManager]
+
+async def deliver(envelope: dict) -> None: ...
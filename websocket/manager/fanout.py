@@ -0,0 +1,191 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+from urllib.parse import urlsplit
+
+from logger import logger
+from settings import WEBSOCKET
+from websocket.broker import max_line
+from websocket.schema import EncodedFrame
+
+DeliveryHandler = Callable[[dict], Awaitable[None]]
+
+
+class FanoutBackend(ABC):
+    """
+    Carries envelopes to every worker. Each worker hands the envelopes it
+    receives to its delivery handler which only writes to the sockets it holds.
+    """
+
+    def __init__(self) -> None:
+        self.handler: DeliveryHandler | None = None
+
+    async def start(self, handler: DeliveryHandler) -> None:
+        self.handler = handler
+
+    async def close(self) -> None:
+        self.handler = None
+
+    @abstractmethod
+    async def publish(self, envelope: dict) -> None:
+        pass
+
+    async def dispatch(self, envelope: dict) -> None:
+        if self.handler is None:
+            raise Exception("FanoutBackend is not started")
+        try:
+            await self.handler(envelope)
+        except Exception as exc:
+            logger.error(f"fanout delivery failed for {envelope.get('target')}: {exc}")
+
+
+class InProcessBackend(FanoutBackend):
+    """Single worker setup, envelopes are delivered straight to this process."""
+
+    async def publish(self, envelope: dict) -> None:
+        await self.dispatch(envelope)
+
+
+class BrokerBackend(FanoutBackend):
+    """
+    Relays envelopes through the broker in websocket/broker.py. The broker echoes
+    every publish back to all subscribers including the publisher, so local
+    delivery goes through the same path as remote delivery.
+    """
+
+    reconnect_delay = 1
+    # seconds a publish waits for the broker before the envelope is dropped
+    publish_timeout = 2
+
+    def __init__(self, url: str, channel: str) -> None:
+        super().__init__()
+        parsed = urlsplit(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 8765
+        self.channel = channel
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.listener: asyncio.Task | None = None
+        self.connected = asyncio.Event()
+
+    async def start(self, handler: DeliveryHandler) -> None:
+        await super().start(handler)
+        await self.connect()
+        self.listener = asyncio.create_task(self.listen())
+
+    async def connect(self) -> None:
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, limit=max_line
+        )
+        await self.send({"op": "subscribe", "channel": self.channel})
+        self.connected.set()
+
+    async def close(self) -> None:
+        if self.listener:
+            self.listener.cancel()
+            self.listener = None
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        self.connected.clear()
+        await super().close()
+
+    async def send(self, data: dict) -> None:
+        self.writer.write(json.dumps(data).encode() + b"\n")
+        await self.writer.drain()
+
+    async def publish(self, envelope: dict) -> None:
+        try:
+            await asyncio.wait_for(self.connected.wait(), self.publish_timeout)
+            await self.send(
+                {"op": "publish", "channel": self.channel, "data": envelope}
+            )
+        except (asyncio.TimeoutError, OSError) as exc:
+            logger.error(
+                f"fanout broker unavailable, dropped {envelope.get('target')}: "
+                f"{exc!r}"
+            )
+
+    async def listen(self) -> None:
+        while True:
+            try:
+                line = await self.reader.readline()
+                if not line:
+                    raise ConnectionError("closed by the broker")
+                data = json.loads(line)["data"]
+            except Exception as exc:
+                # a broken or oversized frame leaves the stream unusable
+                logger.warning(f"fanout broker connection lost, reconnecting: {exc!r}")
+                self.connected.clear()
+                await self.reconnect()
+                continue
+            await self.dispatch(data)
+
+    async def reconnect(self) -> None:
+        if self.writer:
+            self.writer.close()
+        while True:
+            try:
+                await self.connect()
+                return
+            except Exception as exc:
+                logger.warning(f"fanout broker unavailable: {exc!r}")
+                await asyncio.sleep(self.reconnect_delay)
+
+
+def get_fanout_backend() -> FanoutBackend:
+    if WEBSOCKET["FANOUT_BACKEND"] == "broker":
+        return BrokerBackend(WEBSOCKET["BROKER_URL"], WEBSOCKET["BROKER_CHANNEL"])
+    if WEBSOCKET["FANOUT_BACKEND"] == "memory":
+        return InProcessBackend()
+    raise ValueError("WEBSOCKET_FANOUT_BACKEND must be 'memory' or 'broker'")
+
+
+fanout = get_fanout_backend()
+
+
+async def publish_to_user(user_id: int, frame: EncodedFrame) -> None:
+    await fanout.publish({"target": "user", "user_id": user_id, "frame": frame.text})
+
+
+async def publish_to_room(
+    room_id: str, room_users: list[int], frame: EncodedFrame
+) -> None:
+    await fanout.publish(
+        {
+            "target": "room",
+            "room_id": room_id,
+            "room_users": room_users,
+            "frame": frame.text,
+        }
+    )
+
+
+async def publish_close_room(room_id: str) -> None:
+    await fanout.publish({"target": "close_room", "room_id": room_id})
+
+
+async def publish_room_changed(room_id: str) -> None:
+    await fanout.publish({"target": "room_changed", "room_id": room_id})
+
+
+async def publish_presence(user_id: int, worker_id: str, online: bool) -> None:
+    await fanout.publish(
+        {
+            "target": "presence",
+            "user_id": user_id,
+            "worker_id": worker_id,
+            "online": online,
+        }
+    )
+
+
+async def publish_presence_heartbeat(worker_id: str, user_ids: list[int]) -> None:
+    await fanout.publish(
+        {"target": "presence_heartbeat", "worker_id": worker_id, "user_ids": user_ids}
+    )
+
+
+async def publish_presence_sync(worker_id: str) -> None:
+    await fanout.publish({"target": "presence_sync", "worker_id": worker_id})
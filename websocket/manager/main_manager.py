@@ -2,18 +2,17 @@ import json
 
 from fastapi import WebSocket
 
-from account.schemas import UserModel
-from message.utils import change_msg_status
-from notification.schemas import NotificationModel
 from websocket.auth import verify_token
-from websocket.schema import WebsocketRecievedMessage, WebSocketResponse
-from .connections import main_connections
+from websocket.schema import WebsocketRecievedMessage
+from .connections import room_connections
+from .presence import presence
+from .receipts import receipt_coalescer
+from .registry import Connection, registry
+from .room_manager import RoomManager
 
 
-class MainConnectionManager:
-    def __init__(self, websocket: WebSocket, user_id: int) -> None:
-        self.websocket = websocket
-        self.user_id = user_id
+class MainConnectionManager(Connection):
+    multiplexed = True
 
     @classmethod
     async def connect(cls, websocket: WebSocket) -> "MainConnectionManager":
@@ -21,39 +20,42 @@ class MainConnectionManager:
         token = await websocket.receive_text()
         user_id = verify_token(token)
         con = cls(websocket, user_id)
-        main_connections[user_id] = con
+        registry.add_user(con)
+        try:
+            await presence.connected(user_id)
+        except Exception:
+            # the route only cleans up connections that connect returned
+            con.disconnect()
+            raise
         return con
 
-    @staticmethod
-    def disconnect(user_id) -> None:
-        main_connections.pop(user_id, None)
-
-    async def send_msg(self, msg: WebSocketResponse) -> None:
-        await self.websocket.send_text(msg.model_dump_json())
+    def disconnect(self) -> None:
+        for room_id in registry.remove(self):
+            RoomManager.release(room_id)
+        self.outbound.close()
 
-    @staticmethod
-    async def handle_msg(data: str):
+    async def handle_msg(self, data: str):
         try:
             msg = WebsocketRecievedMessage(**(json.loads(data)))
         except ValueError as e:
             print(e.__traceback__)
             return None
 
-        if msg.event_type == "change_message_status":
-            messages = await change_msg_status(
-                msg.data.message_id_list, msg.data.status, msg.sender_user.id
-            )
-            msg_response = WebSocketResponse(
-                event_type=msg.event_type, data=messages, sender_user=msg.sender_user
+        # the sender comes from the client, it must be the authenticated user
+        if msg.sender_user.id != self.user_id:
+            return None
+
+        if msg.event_type == "subscribe_room":
+            await RoomManager.subscribe(msg.room_id, self)
+
+        elif msg.event_type == "unsubscribe_room":
+            RoomManager.leave(msg.room_id, self)
+
+        elif msg.room_id in registry.connection_rooms.get(self, ()):
+            # subscribed rooms behave like a room socket
+            await room_connections[msg.room_id].handle_event(msg)
+
+        elif msg.event_type == "change_message_status":
+            await receipt_coalescer.add(
+                msg.room_id, msg.data.status, msg.data.message_id_list, msg.sender_user
             )
-            for message in messages:
-                if message.sender_id in main_connections:
-                    await main_connections[message.sender_id].send_msg(msg_response)
-
-    async def send_notification(
-        self, notification: NotificationModel, sender_user: UserModel
-    ):
-        notification_data = WebSocketResponse(
-            event_type="notification", data=[notification], sender_user=sender_user
-        )
-        await self.send_msg(notification_data)
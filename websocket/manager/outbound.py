@@ -0,0 +1,87 @@
+import asyncio
+from collections import deque
+
+from fastapi import WebSocket
+from starlette import status
+
+from logger import logger
+from settings import WEBSOCKET
+from websocket.schema import EncodedFrame
+
+slow_consumer_policies = ("drop_oldest", "disconnect")
+
+
+class OutboundQueue:
+    """
+    Bounded queue of frames for one websocket, drained by its own writer task
+    so a slow receiver never holds up the sender. When the queue is full the
+    slow consumer policy either drops the oldest pending frame or disconnects.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_pending: int = WEBSOCKET["OUTBOUND_QUEUE_SIZE"],
+        policy: str = WEBSOCKET["SLOW_CONSUMER_POLICY"],
+    ) -> None:
+        if policy not in slow_consumer_policies:
+            raise ValueError(f"policy must be one of {slow_consumer_policies}")
+        self.websocket = websocket
+        self.max_pending = max_pending
+        self.policy = policy
+        self.frames: deque[EncodedFrame] = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.writer = asyncio.create_task(self.drain())
+
+    @property
+    def depth(self) -> int:
+        return len(self.frames)
+
+    def send(self, frame: EncodedFrame) -> None:
+        if self.closed:
+            return
+        if len(self.frames) >= self.max_pending:
+            if self.policy == "disconnect":
+                logger.warning(f"disconnecting slow consumer after {self.depth} frames")
+                self.close()
+                asyncio.create_task(
+                    self.websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                )
+                return
+            self.frames.popleft()
+            self.dropped += 1
+
+        self.frames.append(frame)
+        self.max_depth = max(self.max_depth, len(self.frames))
+        self.ready.set()
+
+    async def drain(self) -> None:
+        while True:
+            await self.ready.wait()
+            while self.frames:
+                frame = self.frames.popleft()
+                try:
+                    await self.websocket.send_text(frame.text)
+                except Exception:
+                    self.closed = True
+                    self.frames.clear()
+                    return
+                self.sent += 1
+            self.ready.clear()
+
+    def close(self) -> None:
+        self.closed = True
+        self.frames.clear()
+        self.writer.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from typing import Coroutine
+from uuid import uuid4
+
+from database.mangodb import mango_sessionmanager
+from logger import logger
+from message.cache import room_cache
+from message.mangomodel import ChatRoom
+from settings import WEBSOCKET
+from websocket.schema import WebSocketResponse, EncodedFrame, PresenceChange
+from .fanout import (
+    publish_presence,
+    publish_presence_heartbeat,
+    publish_presence_sync,
+)
+from .registry import registry
+
+
+async def load_friend_rooms(user_id: int) -> dict[int, str]:
+    """Friend id to the id of their active friend room, one query."""
+    collection = mango_sessionmanager.engine.get_collection(ChatRoom)
+    cursor = collection.find(
+        {"type": "friend", "is_active": True, "users.user_id": user_id},
+        {"users.user_id": 1},
+    )
+    return {
+        usr["user_id"]: str(room["_id"])
+        async for room in cursor
+        for usr in room["users"]
+        if usr["user_id"] != user_id
+    }
+
+
+class Presence:
+    """
+    Online state of users across workers. Every worker announces the first and
+    last main connection of a user through the fan-out backend, and sends a
+    heartbeat with all of its users every heartbeat seconds. A worker that
+    stays silent for expiry seconds is dropped with its users, and a starting
+    worker asks the others for a heartbeat so it does not wait a full period.
+    For users connected here the friend rooms are kept in memory with a
+    reverse index, so online friends are answered without a query and presence
+    changes are pushed to the friends connected to this worker.
+    """
+
+    def __init__(self, worker_id: str, push: bool, heartbeat: float) -> None:
+        self.worker_id = worker_id
+        self.push = push
+        self.heartbeat = heartbeat
+        self.expiry = heartbeat * 3
+        self.online: dict[int, set[str]] = {}
+        self.worker_users: dict[str, set[int]] = {}
+        self.worker_seen: dict[str, float] = {}
+        # local user -> friend id -> friend room id
+        self.friend_rooms: dict[int, dict[int, str]] = {}
+        # friend id -> local users that have them as a friend
+        self.watchers: dict[int, set[int]] = {}
+        self.ticker: asyncio.Task | None = None
+        self.tasks: set[asyncio.Task] = set()
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self.online
+
+    async def start(self) -> None:
+        self.ticker = asyncio.create_task(self.tick())
+        await publish_presence_sync(self.worker_id)
+
+    async def tick(self) -> None:
+        while True:
+            await self.send_heartbeat()
+            await asyncio.sleep(self.heartbeat)
+            self.expire()
+
+    async def send_heartbeat(self) -> None:
+        await publish_presence_heartbeat(self.worker_id, list(self.friend_rooms))
+
+    async def connected(self, user_id: int) -> None:
+        if user_id in self.friend_rooms:
+            return
+        self.watch(user_id, await load_friend_rooms(user_id))
+        await publish_presence(user_id, self.worker_id, True)
+
+    async def disconnected(self, user_id: int) -> None:
+        if registry.is_online(user_id) or user_id not in self.friend_rooms:
+            return
+        self.unwatch(user_id)
+        await publish_presence(user_id, self.worker_id, False)
+
+    def watch(self, user_id: int, friend_rooms: dict[int, str]) -> None:
+        self.unwatch(user_id)
+        self.friend_rooms[user_id] = friend_rooms
+        for friend_id in friend_rooms:
+            self.watchers.setdefault(friend_id, set()).add(user_id)
+
+    def unwatch(self, user_id: int) -> None:
+        for friend_id in self.friend_rooms.pop(user_id, {}):
+            watchers = self.watchers.get(friend_id)
+            if watchers is not None:
+                watchers.discard(user_id)
+                if not watchers:
+                    del self.watchers[friend_id]
+
+    async def online_friends(self, user_id: int) -> dict[int, str]:
+        """Online friend id to the friend room id."""
+        friend_rooms = self.friend_rooms.get(user_id)
+        if friend_rooms is None:
+            friend_rooms = await load_friend_rooms(user_id)
+        return {
+            friend_id: room_id
+            for friend_id, room_id in friend_rooms.items()
+            if friend_id in self.online
+        }
+
+    def apply(self, user_id: int, worker_id: str, online: bool) -> None:
+        """Apply the announcement of one user."""
+        self.worker_seen[worker_id] = time.monotonic()
+        users = self.worker_users.setdefault(worker_id, set())
+        if online:
+            users.add(user_id)
+        else:
+            users.discard(user_id)
+        self.set_online(user_id, worker_id, online)
+
+    def apply_heartbeat(self, worker_id: str, user_ids: list[int]) -> None:
+        """Replace the users of a worker with the ones of its heartbeat."""
+        self.worker_seen[worker_id] = time.monotonic()
+        previous = self.worker_users.get(worker_id, set())
+        current = self.worker_users[worker_id] = set(user_ids)
+        for user_id in current - previous:
+            self.set_online(user_id, worker_id, True)
+        for user_id in previous - current:
+            self.set_online(user_id, worker_id, False)
+
+    def apply_sync(self, worker_id: str) -> None:
+        """A worker started, answer with a heartbeat right away."""
+        if worker_id != self.worker_id:
+            self.run(self.send_heartbeat())
+
+    def expire(self) -> None:
+        """Drop the users of workers that missed their heartbeats."""
+        deadline = time.monotonic() - self.expiry
+        for worker_id, seen in list(self.worker_seen.items()):
+            if seen < deadline and worker_id != self.worker_id:
+                logger.warning(f"presence: worker {worker_id} expired")
+                del self.worker_seen[worker_id]
+                for user_id in self.worker_users.pop(worker_id, ()):
+                    self.set_online(user_id, worker_id, False)
+
+    def set_online(self, user_id: int, worker_id: str, online: bool) -> None:
+        """Track the worker of a user and push the change when the user flipped."""
+        was_online = user_id in self.online
+        workers = self.online.setdefault(user_id, set())
+        if online:
+            workers.add(worker_id)
+        else:
+            workers.discard(worker_id)
+            if not workers:
+                del self.online[user_id]
+
+        if self.push and was_online != (user_id in self.online):
+            self.notify(user_id, online)
+
+    def notify(self, user_id: int, online: bool) -> None:
+        for watcher in self.watchers.get(user_id, ()):
+            room_id = self.friend_rooms[watcher][user_id]
+            frame = EncodedFrame.encode(
+                WebSocketResponse(
+                    event_type="presence",
+                    data=[
+                        PresenceChange(user_id=user_id, room_id=room_id, online=online)
+                    ],
+                )
+            )
+            for con in registry.user_connections(watcher):
+                con.send_frame(frame)
+
+    def run(self, coro: Coroutine) -> None:
+        """Run off the fan-out dispatch so slow work does not hold other envelopes."""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def refresh_room_later(self, room_id: str) -> None:
+        self.run(self.refresh_room(room_id))
+
+    async def refresh_room(self, room_id: str) -> None:
+        """Reload the friend rooms of the local members of a changed room."""
+        try:
+            room = await room_cache.get(room_id)
+            if room is None or room.type != "friend":
+                return
+            for user_id in room.users:
+                if user_id in self.friend_rooms:
+                    self.watch(user_id, await load_friend_rooms(user_id))
+        except Exception as exc:
+            logger.error(f"presence: failed to refresh room {room_id}: {exc}")
+
+    async def close(self) -> None:
+        if self.ticker:
+            self.ticker.cancel()
+            self.ticker = None
+        for task in list(self.tasks):
+            task.cancel()
+        for user_id in list(self.friend_rooms):
+            self.unwatch(user_id)
+        # an empty heartbeat takes every user of this worker offline at once
+        await self.send_heartbeat()
+
+
+presence = Presence(
+    uuid4().hex, WEBSOCKET["PRESENCE_PUSH"], WEBSOCKET["PRESENCE_HEARTBEAT"]
+)
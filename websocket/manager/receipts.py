@@ -0,0 +1,155 @@
+import asyncio
+
+from account.schemas import UserModel
+from logger import logger
+from message.cache import room_cache
+from message.utils import change_msg_status, mark_room_read
+from settings import WEBSOCKET
+from websocket.schema import WebSocketResponse, EncodedFrame
+from .fanout import publish_to_user, publish_to_room
+
+
+class PendingReceipt:
+    __slots__ = (
+        "room_id",
+        "status",
+        "sender_user",
+        "message_ids",
+        "room_users",
+        "merged",
+    )
+
+    def __init__(self, room_id: str, status: str, sender_user: UserModel) -> None:
+        self.room_id = room_id
+        self.status = status
+        self.sender_user = sender_user
+        self.message_ids: set[str] = set()
+        self.room_users: list[int] | None = None
+        self.merged = 0
+
+
+class ReceiptCoalescer:
+    """
+    Merges change_message_status events of the same user, room and status that
+    arrive within window seconds, so a burst of receipts costs one write and one
+    outgoing event. Receipts from a room socket are broadcast to the room,
+    receipts from the main socket go to the senders of the messages.
+    """
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self.pending: dict[tuple[str, int, str], PendingReceipt] = {}
+        self.timers: dict[tuple[str, int, str], asyncio.Task] = {}
+        self.received = 0
+        self.writes = 0
+        self.frames = 0
+        self.saved_writes = 0
+        self.saved_frames = 0
+
+    async def add(
+        self,
+        room_id: str,
+        status: str,
+        message_ids: list[str],
+        sender_user: UserModel,
+        room_users: list[int] | None = None,
+    ) -> None:
+        key = (room_id, sender_user.id, status)
+        pending = self.pending.get(key)
+        if pending is None:
+            pending = self.pending[key] = PendingReceipt(room_id, status, sender_user)
+        else:
+            pending.merged += 1
+        pending.message_ids.update(message_ids)
+        if room_users is not None:
+            pending.room_users = room_users
+        self.received += 1
+
+        if self.window <= 0:
+            await self.flush(key)
+        elif key not in self.timers:
+            self.timers[key] = asyncio.create_task(self.flush_later(key))
+
+    async def flush_later(self, key: tuple[str, int, str]) -> None:
+        await asyncio.sleep(self.window)
+        self.timers.pop(key, None)
+        await self.flush(key)
+
+    async def flush(self, key: tuple[str, int, str]) -> None:
+        timer = self.timers.pop(key, None)
+        if timer and timer is not asyncio.current_task():
+            timer.cancel()
+        pending = self.pending.pop(key, None)
+        if pending is None:
+            return
+        try:
+            await self.apply(pending)
+        except Exception as exc:
+            logger.error(f"failed to apply read receipts for {key}: {exc}")
+
+    async def flush_user(self, user_id: int) -> None:
+        """Apply the pending receipts of a user right away, used on disconnect."""
+        for key in [key for key in self.pending if key[1] == user_id]:
+            await self.flush(key)
+
+    async def close(self) -> None:
+        for key in list(self.pending):
+            await self.flush(key)
+        logger.info(f"read receipts coalesced: {self.stats()}")
+
+    async def apply(self, pending: PendingReceipt) -> None:
+        user = pending.sender_user
+        message_ids = list(pending.message_ids)
+        room_users = pending.room_users
+        if room_users is None and pending.status == "seen":
+            room = await room_cache.get(pending.room_id)
+            if room is None or user.id not in room.users:
+                return
+            room_users = list(room.users)
+
+        self.writes += 1
+        self.saved_writes += pending.merged
+        if pending.status == "seen":
+            receipt = await mark_room_read(pending.room_id, user.id, message_ids)
+            if receipt is None:
+                return
+            frame = EncodedFrame.encode(
+                WebSocketResponse(
+                    event_type="read_watermark", data=[receipt], sender_user=user
+                )
+            )
+            await publish_to_room(pending.room_id, room_users, frame)
+            self.frames += 1
+            self.saved_frames += pending.merged
+            return
+
+        messages = await change_msg_status(message_ids, pending.status, user.id)
+        if not messages:
+            return
+        frame = EncodedFrame.encode(
+            WebSocketResponse(
+                event_type="change_message_status", data=messages, sender_user=user
+            )
+        )
+        # every merged receipt would have sent at least one frame on its own
+        self.saved_frames += pending.merged
+        if room_users is not None:
+            await publish_to_room(pending.room_id, room_users, frame)
+            self.frames += 1
+            return
+        for sender_id in {message.sender_id for message in messages}:
+            await publish_to_user(sender_id, frame)
+            self.frames += 1
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "pending": len(self.pending),
+            "writes": self.writes,
+            "frames": self.frames,
+            "saved_writes": self.saved_writes,
+            "saved_frames": self.saved_frames,
+        }
+
+
+receipt_coalescer = ReceiptCoalescer(WEBSOCKET["RECEIPT_COALESCE_WINDOW"])
@@ -0,0 +1,103 @@
+from fastapi import WebSocket
+
+from websocket.schema import EncodedFrame
+from .outbound import OutboundQueue
+
+
+class Connection:
+    """One websocket of a user, a user can hold several of them at once."""
+
+    # True when rooms are subscribed over this socket instead of one socket per room
+    multiplexed = False
+
+    def __init__(self, websocket: WebSocket, user_id: int) -> None:
+        self.websocket = websocket
+        self.user_id = user_id
+        self.outbound = OutboundQueue(websocket)
+
+    def send_frame(self, frame: EncodedFrame) -> None:
+        self.outbound.send(frame)
+
+
+class ConnectionRegistry:
+    """
+    Live connections of this worker indexed by user and by room, with a reverse
+    index from a connection to its rooms so removing a connection only touches
+    the rooms it is in.
+    """
+
+    def __init__(self) -> None:
+        self.users: dict[int, set[Connection]] = {}
+        self.rooms: dict[str, set[Connection]] = {}
+        self.connection_rooms: dict[Connection, set[str]] = {}
+
+    def add_user(self, con: Connection) -> None:
+        self.users.setdefault(con.user_id, set()).add(con)
+
+    def remove_user(self, con: Connection) -> None:
+        connections = self.users.get(con.user_id)
+        if connections is not None:
+            connections.discard(con)
+            if not connections:
+                del self.users[con.user_id]
+
+    def join_room(self, room_id: str, con: Connection) -> None:
+        self.rooms.setdefault(room_id, set()).add(con)
+        self.connection_rooms.setdefault(con, set()).add(room_id)
+
+    def leave_room(self, room_id: str, con: Connection) -> None:
+        connections = self.rooms.get(room_id)
+        if connections is not None:
+            connections.discard(con)
+            if not connections:
+                del self.rooms[room_id]
+        rooms = self.connection_rooms.get(con)
+        if rooms is not None:
+            rooms.discard(room_id)
+            if not rooms:
+                del self.connection_rooms[con]
+
+    def remove(self, con: Connection) -> list[str]:
+        """Drop a connection from every index, returns the rooms it left."""
+        self.remove_user(con)
+        rooms = list(self.connection_rooms.get(con, ()))
+        for room_id in rooms:
+            self.leave_room(room_id, con)
+        return rooms
+
+    def close_room(self, room_id: str) -> set[Connection]:
+        connections = self.rooms.pop(room_id, set())
+        for con in connections:
+            rooms = self.connection_rooms.get(con)
+            if rooms is not None:
+                rooms.discard(room_id)
+                if not rooms:
+                    del self.connection_rooms[con]
+        return connections
+
+    def room_recipients(self, room_id: str, room_users: list[int]) -> set[Connection]:
+        """
+        Connections a room frame goes to: the connections in the room and the
+        other connections of its members. A main connection subscribed to the
+        room already gets it, and members with a legacy room socket here see
+        the room there, so their main connections are skipped.
+        """
+        connections = self.room_connections(room_id)
+        room_socket_users = {con.user_id for con in connections if not con.multiplexed}
+        recipients = set(connections)
+        for user_id in room_users:
+            if user_id not in room_socket_users:
+                recipients.update(self.user_connections(user_id))
+        return recipients
+
+    def user_connections(self, user_id: int) -> set[Connection]:
+        return self.users.get(user_id, set())
+
+    def room_connections(self, room_id: str) -> set[Connection]:
+        return self.rooms.get(room_id, set())
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self.users
+
+
+registry = ConnectionRegistry()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 
 from anyio import value
@@ -6,26 +7,31 @@ from sqlalchemy import delete
 from starlette import status
 
 from account.schemas import UserModel
-from message.utils import save_new_message, change_msg_status
+from message.utils import save_new_message
 from websocket.auth import verify_token
-from database.mangodb import mango_sessionmanager
-from message.mangomodel import ChatRoom, Message
-from bson import ObjectId
-from bson.errors import InvalidId
-from websocket.schema import WebsocketRecievedMessage, WebSocketResponse, EventType
-from .connections import room_connections, main_connections
+from message.cache import CachedRoom, room_cache
+from message.mangomodel import Message
+from message.schema import MessageStatusChange, ReadReceipt
+from websocket.schema import (
+    WebsocketRecievedMessage,
+    WebSocketResponse,
+    EventType,
+    EncodedFrame,
+)
+from .connections import room_connections
+from .fanout import publish_to_room
+from .receipts import receipt_coalescer
+from .registry import Connection, registry
 
 
 class RoomManager:
     def __init__(self, room_name: str):
         self.room = room_name
-        self.connected_users: dict[int, WebSocket] = {}
-        self.room_users: list[int] = []
 
     @classmethod
     async def connect(
         cls, websocket: WebSocket, room_id: str
-    ) -> tuple["RoomManager", int]:
+    ) -> tuple["RoomManager", Connection]:
         await websocket.accept()
         room = await cls.check_room(room_id)
         if not room:
@@ -36,40 +42,69 @@ class RoomManager:
         token = await websocket.receive_text()
         user_id = verify_token(token)
 
-        if room_id in room_connections:
-            room_connections[room_id].connected_users[user_id] = websocket
-        else:
-            new_room = cls(room_id)
-            new_room.room_users = [usr.user_id for usr in room.users]
-            new_room.connected_users[user_id] = websocket
-            room_connections[room_id] = new_room
+        con = Connection(websocket, user_id)
+        return cls.join(room_id, con), con
 
-        return room_connections[room_id], user_id
+    @classmethod
+    def join(cls, room_id: str, con: Connection) -> "RoomManager":
+        if room_id not in room_connections:
+            room_connections[room_id] = cls(room_id)
+        registry.join_room(room_id, con)
+        return room_connections[room_id]
+
+    @classmethod
+    async def subscribe(cls, room_id: str, con: Connection) -> "RoomManager | None":
+        """Join a room over an already open connection, members only."""
+        room = await cls.check_room(room_id)
+        if not room or con.user_id not in room.users:
+            return None
+        return cls.join(room_id, con)
+
+    @staticmethod
+    def leave(room_id: str, con: Connection):
+        registry.leave_room(room_id, con)
+        RoomManager.release(room_id)
 
     @staticmethod
-    def disconnect(room_id: str, user_id: int):
+    def release(room_id: str):
         room = room_connections.get(room_id)
-        if room:
-            room.connected_users.pop(user_id, None)
-            if not room.connected_users:
-                room.delete_room()
+        if room and not registry.room_connections(room_id):
+            room.delete_room()
+
+    @staticmethod
+    def disconnect(room_id: str, con: Connection):
+        registry.remove(con)
+        con.outbound.close()
+        RoomManager.release(room_id)
 
     async def close_room(self):
-        for key in self.connected_users.copy().keys():
-            await self.connected_users[key].close()
+        connections = registry.close_room(self.room)
         self.delete_room()
+        # multiplexed connections only lose the subscription, room sockets close
+        connections = [con for con in connections if not con.multiplexed]
+        for con in connections:
+            con.outbound.close()
+        await asyncio.gather(
+            *(con.websocket.close() for con in connections),
+            return_exceptions=True,
+        )
 
     def delete_room(self):
         if self.room in room_connections:
             del room_connections[self.room]
 
-    async def handle_msg(self, data: str):
+    async def handle_msg(self, data: str, con: Connection):
         try:
             msg = WebsocketRecievedMessage(**(json.loads(data)))
         except ValueError as e:
             print(e.__traceback__)
             return None
 
+        if msg.sender_user.id != con.user_id:
+            return None
+        await self.handle_event(msg)
+
+    async def handle_event(self, msg: WebsocketRecievedMessage):
         if msg.event_type == "new_message":
             message = await save_new_message(
                 {
@@ -81,37 +116,34 @@ class RoomManager:
             await self.broadcast([message], msg.event_type, msg.sender_user)
 
         elif msg.event_type == "change_message_status":
-            message = await change_msg_status(
-                msg.data.message_id_list, msg.data.status, msg.sender_user.id
+            await receipt_coalescer.add(
+                self.room,
+                msg.data.status,
+                msg.data.message_id_list,
+                msg.sender_user,
+                await self.get_room_users(),
             )
-            await self.broadcast(message, msg.event_type, msg.sender_user)
 
     async def broadcast(
-        self, msg: list[Message], event_type: EventType, sender_user: UserModel
+        self,
+        msg: list[Message] | list[MessageStatusChange] | list[ReadReceipt],
+        event_type: EventType,
+        sender_user: UserModel,
     ):
-        msg_response = WebSocketResponse(
-            event_type=event_type, data=msg, sender_user=sender_user
+        # serialized once, every worker delivers it to the sockets it holds.
+        msg_response = EncodedFrame.encode(
+            WebSocketResponse(event_type=event_type, data=msg, sender_user=sender_user)
         )
+        await publish_to_room(self.room, await self.get_room_users(), msg_response)
 
-        # send a msg to online user who not connected in room.
-        for user in [
-            usr for usr in self.room_users if usr not in self.connected_users.keys()
-        ]:
-            if user in main_connections.keys():
-                await main_connections[user].send_msg(msg_response)
-
-        for websocket in self.connected_users.values():
-            await websocket.send_text(msg_response.model_dump_json())
+    async def get_room_users(self) -> list[int]:
+        room = await room_cache.get(self.room)
+        return list(room.users) if room else []
 
     @staticmethod
-    async def check_room(room_id: str):
-        try:
-            room_object_id = ObjectId(room_id)
-        except InvalidId:
+    async def check_room(room_id: str) -> CachedRoom | None:
+        room = await room_cache.get(room_id)
+        if room:
+            return room if room.is_active else None
+        else:
             return None
-        async with mango_sessionmanager.engine.session() as mangodb:
-            room = await mangodb.find_one(ChatRoom, ChatRoom.id == room_object_id)
-            if room:
-                return room if room.is_active else None
-            else:
-                return None
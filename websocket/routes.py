@@ -1,6 +1,11 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Request
 
+from auth.permission import require_authentication
+from message.cache import room_cache
+from websocket.manager.registry import registry
 from websocket.manager.main_manager import MainConnectionManager
+from websocket.manager.presence import presence
+from websocket.manager.receipts import receipt_coalescer
 from websocket.manager.room_manager import RoomManager
 from logger import logger
 
@@ -9,31 +14,51 @@ router = APIRouter(prefix="/ws", tags=["ws"])
 
 @router.websocket("/")
 async def websocket_main(websocket: WebSocket):
-    websocket_user = None
+    con = None
     try:
         con = await MainConnectionManager.connect(websocket)
-        websocket_user = con.user_id
         while True:
             data = await websocket.receive_text()
             await con.handle_msg(data)
     except WebSocketDisconnect:
-        logger.info(f"user with id {websocket_user} main websocket closed")
+        logger.info(f"user with id {con and con.user_id} main websocket closed")
     finally:
-        if websocket_user:
-            MainConnectionManager.disconnect(websocket_user)
+        if con:
+            con.disconnect()
+            await receipt_coalescer.flush_user(con.user_id)
+            await presence.disconnected(con.user_id)
 
 
 @router.websocket("/{room_id}")
 async def websocket_endpoint(websocket: WebSocket, room_id: str):
-    websocket_user = None
+    con = None
     try:
-        room, user_id = await RoomManager.connect(websocket, room_id)
-        websocket_user = user_id
+        room, con = await RoomManager.connect(websocket, room_id)
         while True:
             data = await websocket.receive_text()
-            await room.handle_msg(data)
+            await room.handle_msg(data, con)
     except WebSocketDisconnect:
-        logger.info(f"user with id {websocket_user} room websocket closed")
+        logger.info(f"user with id {con and con.user_id} room websocket closed")
     finally:
-        if websocket_user:
-            RoomManager.disconnect(room_id, websocket_user)
+        if con:
+            RoomManager.disconnect(room_id, con)
+            await receipt_coalescer.flush_user(con.user_id)
+
+
+@router.get("/stats")
+@require_authentication(is_superuser=True)
+async def websocket_stats(request: Request):
+    return {
+        "main": {
+            user_id: [con.outbound.stats() for con in connections]
+            for user_id, connections in registry.users.items()
+        },
+        "rooms": {
+            room_id: [
+                {"user_id": con.user_id, **con.outbound.stats()} for con in connections
+            ]
+            for room_id, connections in registry.rooms.items()
+        },
+        "receipts": receipt_coalescer.stats(),
+        "room_cache": room_cache.stats(),
+    }
@@ -3,16 +3,38 @@ from typing import Union, Literal
 from pydantic import BaseModel, model_validator
 
 from message.mangomodel import Message
+from message.schema import MessageStatusChange, ReadReceipt
 from notification.schemas import NotificationModel
 from account.schemas import UserModel
 
-type EventType = Literal["new_message", "change_message_status", "notification"]
+type EventType = Literal[
+    "new_message",
+    "change_message_status",
+    "read_watermark",
+    "notification",
+    "subscribe_room",
+    "unsubscribe_room",
+    "presence",
+]
+
+
+class PresenceChange(BaseModel):
+    user_id: int
+    room_id: str
+    online: bool
 
 
 class WebSocketResponse(BaseModel):
     event_type: EventType
-    data: list[Message] | list[NotificationModel]
-    sender_user: UserModel
+    data: (
+        list[Message]
+        | list[MessageStatusChange]
+        | list[ReadReceipt]
+        | list[NotificationModel]
+        | list[PresenceChange]
+    )
+    # presence changes are sent by the server, not by a user
+    sender_user: UserModel | None = None
 
     @model_validator(mode="after")
     def validate_data_type(self):
@@ -21,19 +43,48 @@ class WebSocketResponse(BaseModel):
                 raise ValueError(
                     "Data must be a list of NotificationModel for 'notification' event_type"
                 )
-        elif self.event_type in ("new_message", "change_message_status"):
+        elif self.event_type == "new_message":
             if not all(isinstance(item, Message) for item in self.data):
                 raise ValueError(
-                    "Data must be a list of Message for 'new_message' or 'change_message_status' event_type"
+                    "Data must be a list of Message for 'new_message' event_type"
+                )
+        elif self.event_type == "change_message_status":
+            if not all(isinstance(item, MessageStatusChange) for item in self.data):
+                raise ValueError(
+                    "Data must be a list of MessageStatusChange for 'change_message_status' event_type"
+                )
+        elif self.event_type == "read_watermark":
+            if not all(isinstance(item, ReadReceipt) for item in self.data):
+                raise ValueError(
+                    "Data must be a list of ReadReceipt for 'read_watermark' event_type"
+                )
+        elif self.event_type == "presence":
+            if not all(isinstance(item, PresenceChange) for item in self.data):
+                raise ValueError(
+                    "Data must be a list of PresenceChange for 'presence' event_type"
                 )
 
         return self
 
 
+class EncodedFrame:
+    """WebSocketResponse serialized once, the same text is shared by every send."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    @classmethod
+    def encode(cls, response: WebSocketResponse) -> "EncodedFrame":
+        return cls(response.model_dump_json())
+
+
 class WebsocketRecievedMessage(BaseModel):
     event_type: EventType
     room_id: str
-    data: Union["NewMessageEvent", "ChangeMessageStatusEvent"]
+    # subscribe_room and unsubscribe_room only need the room_id
+    data: Union["NewMessageEvent", "ChangeMessageStatusEvent", None] = None
     sender_user: UserModel
 
     @model_validator(mode="after")